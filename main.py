@@ -201,17 +201,16 @@ def extract_frames_from_video():
         print(f"ℹ️ Using existing frames in {FRAME_DIR}")
         return
     print(f"Extracting frames every {INTERVAL_SECONDS}s…")
+    # One decode pass feeds both crops
     subprocess.run([
-        "ffmpeg", "-i", VIDEO_FILE,
-        "-vf", f"fps=1/{INTERVAL_SECONDS},crop=in_w*0.4:in_h*0.0475:in_w*0.03:in_h*0.875",
-        f"{TITLE_DIR}/frame_%04d.jpg",
-        "-hide_banner", "-loglevel", "error"
-    ], check=True)
-    subprocess.run([
-        "ffmpeg", "-i", VIDEO_FILE,
-        "-vf", f"fps=1/{INTERVAL_SECONDS},crop=in_w*0.4:in_h*0.06:in_w*0.055:in_h*0.03",
-        f"{FRAME_DIR}/frame_%04d.jpg",
-        "-hide_banner", "-loglevel", "error"
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", VIDEO_FILE,
+        "-filter_complex",
+        f"[0:v]fps=1/{INTERVAL_SECONDS},split=2[t][f];"
+        "[t]crop=in_w*0.4:in_h*0.0475:in_w*0.03:in_h*0.875[title];"
+        "[f]crop=in_w*0.4:in_h*0.06:in_w*0.055:in_h*0.03[frame]",
+        "-map", "[title]", f"{TITLE_DIR}/frame_%04d.jpg",
+        "-map", "[frame]", f"{FRAME_DIR}/frame_%04d.jpg",
     ], check=True)
     print("✅ Frames & title crops extracted.")
 
@@ -357,7 +356,7 @@ def extract_segment_clips(segs):
                 "-t", str(dur), out
             ], check=True)
 
-if __name__ == "__main__":
+def run():
     print("=== YouTube Segment Detector (one GPT call per video) ===")
     segments = find_youtube_segments()
     filt = [(cid, st, ed, t) for cid, st, ed, t in segments if (ed - st) >= MIN_SEGMENT_DURATION]
@@ -372,3 +371,7 @@ if __name__ == "__main__":
         df.to_csv("segments.csv", index=False)
         print("Saved segments.csv")
         extract_segment_clips(filt)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,100 @@
+"""
+Helpers shared by the Modal pipelines
+
+File copies that stay in the kernel, hardlink-or-copy for results, and the
+ffmpeg settings the T4 pipelines use for NVENC. Each Modal image ships this
+module with add_local_python_source("modal_common").
+"""
+import errno
+import json
+import os
+import shutil
+import subprocess
+
+# ffmpeg output arguments for TwitchDownloaderCLI to encode chat with NVENC
+NVENC_OUTPUT_ARGS = '-c:v h264_nvenc -preset p4 -b:v 4M -pix_fmt yuv420p -f mp4 -y "{save_path}"'
+
+# Throughput-first h264_nvenc settings for the combine: fastest preset, a
+# deeper async surface queue, and bitrate-capped constant quality
+NVENC_COMBINE_ARGS = [
+    "-c:v", "h264_nvenc", "-preset", "p1", "-tune", "hq", "-rc", "vbr", "-cq", "23",
+    "-b:v", "6M", "-maxrate", "10M", "-bufsize", "12M", "-bf", "3", "-g", "60", "-surfaces", "32",
+]
+
+# Buffer size for the userspace copy fallback; large reads keep the syscall
+# count down on the network-backed volume
+COPY_BUFSIZE = 4 * 1024 * 1024
+
+def copy_file(src, dst):
+    """Copy src to dst keeping the data inside the kernel where possible.
+
+    Uses copy_file_range, then sendfile if the filesystems don't support it,
+    then a plain read/write loop as a last resort.
+    """
+    in_fd = os.open(src, os.O_RDONLY)
+    try:
+        out_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            size = os.fstat(in_fd).st_size
+            offset = 0
+
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(in_fd, out_fd, size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+            except (AttributeError, OSError) as e:
+                if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+                try:
+                    while offset < size:
+                        sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                        if sent == 0:
+                            break
+                        offset += sent
+                except OSError as e:
+                    if e.errno not in (errno.EINVAL, errno.ENOSYS):
+                        raise
+
+            if offset < size:
+                # sendfile with an explicit offset leaves the read position alone
+                os.lseek(in_fd, offset, os.SEEK_SET)
+                buf = bytearray(COPY_BUFSIZE)
+                view = memoryview(buf)
+                while True:
+                    n = os.readv(in_fd, [buf])
+                    if n == 0:
+                        break
+                    written = 0
+                    while written < n:
+                        written += os.write(out_fd, view[written:n])
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
+    shutil.copymode(src, dst)
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a copy when a link isn't possible"""
+    try:
+        os.unlink(dst)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        # Different filesystems, or one that doesn't do hardlinks
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP):
+            raise
+        copy_file(src, dst)
+
+def video_height(path):
+    """Return the height of the first video stream in path, or None if ffprobe can't tell"""
+    try:
+        probe = json.loads(subprocess.check_output(
+            ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_streams", "-select_streams", "v:0", path]
+        ))
+        return probe["streams"][0]["height"]
+    except (subprocess.CalledProcessError, ValueError, KeyError, IndexError):
+        return None
@@ -7,11 +7,20 @@ It's designed to be deployed to Modal with `modal deploy`.
 """
 
 import modal
+import errno
+import functools
+import hashlib
+import math
 import subprocess
 import os
+import re
+import mmap
 import time
 import sys
-import select
+import shutil
+import selectors
+from collections import deque
+from modal_common import COPY_BUFSIZE, link_or_copy
 
 # Define app
 app = modal.App("twitch-vod-processor")
@@ -28,105 +37,239 @@ image = (
         "ca-certificates",
         "git",  # For twitch-dl --chapter
     )
-    .pip_install("twitch-dl==3.0.0")  # Using the latest version
+    .pip_install(
+        "twitch-dl==3.0.0",  # Using the latest version
+        "ijson",  # Streaming parser for repairing truncated chat JSON
+        "orjson",  # Fast serializer for rewriting repaired chat JSON
+    )
     .run_commands(
         # Test that twitch-dl works
         "twitch-dl --version"
     )
+    .run_commands(
+        # Bake TwitchDownloaderCLI into the image layer so workers don't fetch it at runtime
+        "curl -L -o /tmp/td.zip "
+        "https://github.com/lay295/TwitchDownloader/releases/download/1.55.5/TwitchDownloaderCLI-1.55.5-Linux-x64.zip && "
+        "unzip -o /tmp/td.zip -d /usr/local/bin && "
+        "chmod +x /usr/local/bin/TwitchDownloaderCLI && rm /tmp/td.zip"
+    )
+    .add_local_python_source("modal_common")
 )
 
-@app.function(image=image, volumes={"/data": volume}, timeout=7200)
-def download_downloader():
-    """Download and setup TwitchDownloaderCLI"""
-    import os
-    import subprocess
-    import time
+DOWNLOADER_PATH = "/usr/local/bin/TwitchDownloaderCLI"
+
+# Resolve tool paths once per container instead of a PATH search on every spawn
+TWITCH_DL = shutil.which("twitch-dl") or "twitch-dl"
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+FFPROBE = shutil.which("ffprobe") or "ffprobe"
+
+# Quality names `twitch-dl info` lists for a VOD's playlists
+KNOWN_QUALITIES = {"1080p60", "1080p30", "720p60", "720p30", "480p30", "360p30", "160p30", "audio_only", "chunked"}
+
+# Child output is read in 64 KB chunks and split into lines here, so decoding
+# happens once per complete line instead of through a TextIOWrapper per byte
+PIPE_READ_SIZE = 65536
+
+def _read_pipe_lines(fd, pending):
+    """Read a chunk from fd and return (complete decoded lines, eof).
+
+    pending is a bytearray holding any partial trailing line between calls;
+    at EOF whatever is left in it is returned as the final line.
+    """
+    chunk = os.read(fd, PIPE_READ_SIZE)
+    if not chunk:
+        tail = bytes(pending)
+        pending.clear()
+        return ([tail.decode(errors='replace')] if tail else []), True
+
+    # Progress bars (ffmpeg stats, TwitchDownloaderCLI status) redraw with a
+    # bare \r, so treat it as a line break the way universal newlines did
+    pending += chunk.replace(b'\r', b'\n')
+    *complete, rest = pending.split(b'\n')
+    pending[:] = rest
+    return [line.decode(errors='replace') + '\n' for line in complete if line], False
+
+def _stop_process(process):
+    """Terminate a child process, killing it if it doesn't exit promptly"""
+    process.terminate()
+    time.sleep(1)
+    if process.poll() is None:
+        print("Process didn't terminate gracefully, killing it...")
+        process.kill()
+
+def _run_with_monitor(cmd, output_path, overall_timeout=7200, stall_timeout=180,
+                      progress_interval=10, label="Download", expected_size_mb=None):
+    """Run cmd while streaming its output and watching output_path grow.
+
+    stdout/stderr are drained through a single selector. The process is stopped
+    once overall_timeout is exceeded, or when the output file has stopped
+    growing for stall_timeout seconds (pass None to disable stall detection).
+    Returns (returncode, stdout, stderr).
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0
+    )
+    print(f"Started {label.lower()} process with PID {process.pid}, timeout: {overall_timeout}s")
 
-    downloader_path = "/data/bin/TwitchDownloaderCLI"
+    out_fd = process.stdout.fileno()
+    err_fd = process.stderr.fileno()
+    sel = selectors.DefaultSelector()
+    sel.register(out_fd, selectors.EVENT_READ, "OUT")
+    sel.register(err_fd, selectors.EVENT_READ, "ERR")
+    pending = {out_fd: bytearray(), err_fd: bytearray()}
+    captured = {"OUT": [], "ERR": []}
 
-    # Check if already exists
-    if os.path.exists(downloader_path):
-        print(f"TwitchDownloaderCLI already exists at {downloader_path}")
-        # Verify it's executable
-        subprocess.run(["chmod", "+x", downloader_path], check=True)
-        return downloader_path
+    # Track start time for timeout
+    start_time = time.time()
+    last_progress_time = start_time
 
-    # Create directory if it doesn't exist
-    os.makedirs("/data/bin", exist_ok=True)
+    # Variables for stall detection
+    last_file_size = 0
+    last_size_change_time = start_time
 
-    # Latest release URL
-    url = "https://github.com/lay295/TwitchDownloader/releases/download/1.55.5/TwitchDownloaderCLI-1.55.5-Linux-x64.zip"
+    # Keep the output file open once it appears so size probes are
+    # fstat() calls on the fd rather than path lookups on /data
+    probe_fd = None
 
-    # Download and extract with retry logic
-    print(f"Downloading TwitchDownloaderCLI from {url}")
+    try:
+        while process.poll() is None:
+            # The select timeout doubles as the loop's sleep
+            for key, _ in sel.select(timeout=1.0):
+                lines, eof = _read_pipe_lines(key.fd, pending[key.fd])
+                for line in lines:
+                    captured[key.data].append(line)
+                    print(f"{key.data}: {line.strip()}")
+                if eof:
+                    sel.unregister(key.fd)
+
+            current_time = time.time()
+            elapsed = current_time - start_time
+
+            # Check for timeout
+            if elapsed > overall_timeout:
+                print(f"⚠️ {label} timed out after {overall_timeout} seconds. Terminating process.")
+                _stop_process(process)
+                break
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            print(f"Download attempt {attempt+1}/{max_retries}")
+            # Open the file on first appearance and get current size
+            if probe_fd is None:
+                try:
+                    probe_fd = os.open(output_path, os.O_RDONLY)
+                except FileNotFoundError:
+                    pass
 
-            # Download with curl and verbose output
-            print("Running curl download...")
-            subprocess.run(
-                ["curl", "-L", "-v", "-o", "/data/twitch-dl.zip", url],
-                check=True
-            )
+            current_file_size = 0
+            if probe_fd is not None:
+                try:
+                    current_file_size = os.fstat(probe_fd).st_size
+                except OSError:
+                    current_file_size = 0
 
-            # Verify download size
-            print("Checking download size...")
-            file_info = subprocess.run(
-                ["ls", "-la", "/data/twitch-dl.zip"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            print(f"Download file info: {file_info.stdout}")
+            # Check for stalled output
+            if stall_timeout is not None and current_file_size > 0:
+                if current_file_size == last_file_size:
+                    stall_duration = current_time - last_size_change_time
+                    if stall_duration > stall_timeout:
+                        print(f"{label} appears stalled - file size hasn't changed in {stall_duration:.0f} seconds")
+                        print("Killing the process and trying again...")
+                        _stop_process(process)
+                        break
+                else:
+                    # File size changed, update tracking variables
+                    last_file_size = current_file_size
+                    last_size_change_time = current_time
+
+            # Print periodic progress updates
+            if current_time - last_progress_time > progress_interval:
+                print(f"{label} in progress... (running for {int(elapsed)} seconds)")
+
+                if probe_fd is not None:
+                    file_size_mb = current_file_size / (1024 * 1024)
+                    speed_mbps = file_size_mb / elapsed if elapsed > 0 else 0
+                    print(f"Current file size: {file_size_mb:.2f} MB (Speed: {speed_mbps:.2f} MB/s)")
+
+                    # Estimate remaining time if the caller knows roughly how big the output gets
+                    if expected_size_mb and file_size_mb > 0 and speed_mbps > 0:
+                        remaining_min = (expected_size_mb - file_size_mb) / speed_mbps / 60
+                        print(f"Estimated time remaining: {remaining_min:.0f} minutes")
+                else:
+                    print("File not created yet")
 
-            # List directory contents for debugging
-            print("Contents of /data directory:")
-            subprocess.run(["ls", "-la", "/data"], check=True)
+                last_progress_time = current_time
 
-            # Unzip to bin directory
-            print("Extracting zip file...")
-            subprocess.run(
-                ["unzip", "-o", "/data/twitch-dl.zip", "-d", "/data/bin"],
-                check=True
-            )
+        # Drain any bytes still in the pipe buffers without blocking, so a
+        # grandchild holding a pipe open can't hang us the way communicate() can
+        for key in list(sel.get_map().values()):
+            os.set_blocking(key.fd, False)
+            try:
+                eof = False
+                while not eof:
+                    lines, eof = _read_pipe_lines(key.fd, pending[key.fd])
+                    for line in lines:
+                        captured[key.data].append(line)
+                        print(f"{key.data}: {line.strip()}")
+            except BlockingIOError:
+                pass
+        returncode = process.wait()
+    finally:
+        sel.close()
+        process.stdout.close()
+        process.stderr.close()
+        if probe_fd is not None:
+            os.close(probe_fd)
+
+    # Keep any partial last line that never got a newline
+    stdout = ''.join(captured["OUT"]) + pending[out_fd].decode(errors='replace')
+    stderr = ''.join(captured["ERR"]) + pending[err_fd].decode(errors='replace')
+    return returncode, stdout, stderr
+
+def _manifest_path(vod_id):
+    return f"/data/manifest_{vod_id}.json"
+
+def _read_manifest(vod_id):
+    """Return {stage: {"path", "size"}} for vod_id's finished stages, empty if there's no manifest"""
+    import json
+    try:
+        with open(_manifest_path(vod_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(vod_id, stage, path, size=0):
+    """Record a stage's output in the manifest, or drop the stage when path is None"""
+    import json
+    manifest = _read_manifest(vod_id)
+    if path is None:
+        if stage not in manifest:
+            return
+        manifest.pop(stage)
+    else:
+        manifest[stage] = {"path": path, "size": size}
 
-            # List directory contents after unzip
-            print("Contents of /data/bin directory:")
-            subprocess.run(["ls", "-la", "/data/bin"], check=True)
+    # Write-then-rename so readers never see a half-written manifest
+    manifest_path = _manifest_path(vod_id)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
 
-            # Make executable
-            print("Setting executable permissions...")
-            subprocess.run(
-                ["chmod", "+x", downloader_path],
-                check=True
-            )
+def _publish():
+    """Commit the volume so the next stage's container sees this stage's output.
 
-            # Verify executable works
-            print("Testing TwitchDownloaderCLI...")
-            version_check = subprocess.run(
-                [downloader_path, "--version"],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            print(f"Version check output: {version_check.stdout}")
-            print(f"Version check error: {version_check.stderr}")
+    Each container works on its own view of the volume until it commits.
+    """
+    volume.commit()
 
-            print(f"TwitchDownloaderCLI setup completed at {downloader_path}")
-            return downloader_path
+@app.function(image=image)
+def download_downloader():
+    """Return the TwitchDownloaderCLI path.
 
-        except Exception as e:
-            print(f"Error setting up TwitchDownloaderCLI (attempt {attempt+1}): {e}")
-            if attempt < max_retries - 1:
-                wait_time = 5 * (attempt + 1)  # Exponential backoff
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                print("All download attempts failed.")
-                raise
+    The binary is installed into the image at build time; this function is
+    kept so existing callers keep working.
+    """
+    return DOWNLOADER_PATH
 
 @app.function(image=image, volumes={"/data": volume}, timeout=7200)
 def download_vod(vod_id, force=False):
@@ -148,14 +291,15 @@ def download_vod(vod_id, force=False):
     elif force:
         print(f"Force download requested for VOD {vod_id}")
 
-    # Check if VOD exists function with retries
-    def check_vod_exists(max_attempts=100, delay=1):
+    # Check that the VOD exists (with retries) and return the set of qualities
+    # listed by `twitch-dl info`, or None if it never became accessible
+    def probe_vod(max_attempts=100, delay=1):
         for attempt in range(max_attempts):
             try:
                 print(f"Checking if VOD {vod_id} exists... (Attempt {attempt+1}/{max_attempts})")
                 # Run with full output capture
                 result = subprocess.run(
-                    ["twitch-dl", "info", vod_id],
+                    [TWITCH_DL, "info", vod_id],
                     capture_output=True,
                     text=True,
                     check=False  # Don't raise exception, we'll check manually
@@ -164,7 +308,7 @@ def download_vod(vod_id, force=False):
                 if result.returncode == 0:
                     print("VOD exists and is accessible!")
                     print(result.stdout)
-                    return True
+                    return {q for q in KNOWN_QUALITIES if q in result.stdout}
 
                 print(f"Error checking VOD: Return code {result.returncode} (Attempt {attempt+1})")
                 print(f"STDOUT: {result.stdout}")
@@ -180,7 +324,7 @@ def download_vod(vod_id, force=False):
                 if attempt >= 5 and attempt % 5 == 0:
                     print("Trying alternative method to check VOD...")
                     videos_result = subprocess.run(
-                        ["twitch-dl", "videos", "forsen", "--limit", "5"],
+                        [TWITCH_DL, "videos", "forsen", "--limit", "5"],
                         capture_output=True,
                         text=True,
                         check=False
@@ -196,8 +340,8 @@ def download_vod(vod_id, force=False):
                 print(f"Unexpected error checking VOD (Attempt {attempt+1}): {e}")
                 time.sleep(delay)
 
-        # If we've exhausted all retries, return False
-        return False
+        # If we've exhausted all retries, report the VOD as inaccessible
+        return None
 
     # Function to download VOD with retries and simpler progress monitoring
     def download_with_quality(quality, max_attempts=100, delay=1, timeout=7200):
@@ -208,7 +352,7 @@ def download_vod(vod_id, force=False):
 
                 # Try a different approach with more verbose output and debug flags
                 cmd = [
-                    "twitch-dl", "download",
+                    TWITCH_DL, "download",
                     "-q", quality,
                     vod_id,
                     "-c", "1",
@@ -219,124 +363,9 @@ def download_vod(vod_id, force=False):
                 # Print the full command we're running
                 print(f"Running command: {' '.join(cmd)}")
 
-                # Start process with simple output capture
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                    bufsize=1
-                )
-
-                # Track start time for timeout
-                start_time = time.time()
-                last_progress_time = start_time
-
-                # Monitor process with timeout - simpler approach
-                import threading
-
-                # Variables to collect output
-                stdout_data = []
-                stderr_data = []
-                process_running = True
-
-                # Function to read output streams
-                def read_output(pipe, data_list):
-                    for line in iter(pipe.readline, ''):
-                        if line:
-                            data_list.append(line)
-                            print(line.strip())
-
-                # Start threads to read output
-                stdout_thread = threading.Thread(
-                    target=read_output,
-                    args=(process.stdout, stdout_data)
-                )
-                stderr_thread = threading.Thread(
-                    target=read_output,
-                    args=(process.stderr, stderr_data)
+                return_code, stdout_content, stderr_content = _run_with_monitor(
+                    cmd, output_path, overall_timeout=timeout, expected_size_mb=20000  # ~20GB for 7-8h VOD at high quality
                 )
-                stdout_thread.daemon = True
-                stderr_thread.daemon = True
-                stdout_thread.start()
-                stderr_thread.start()
-
-                # Variables for stall detection
-                last_file_size = 0
-                last_size_change_time = time.time()
-                stall_timeout = 180  # 3 minutes with no file size change = stall
-
-                # Monitor the process
-                while process.poll() is None:
-                    # Check for timeout
-                    current_time = time.time()
-                    if current_time - start_time > timeout:
-                        print(f"Download timed out after {timeout} seconds, killing process...")
-                        process.kill()
-                        break
-
-                    # Check if file exists and get current size
-                    current_file_size = 0
-                    if os.path.exists(output_path):
-                        current_file_size = os.path.getsize(output_path)
-
-                    # Check for stalled download
-                    if current_file_size > 0:
-                        if current_file_size == last_file_size:
-                            stall_duration = current_time - last_size_change_time
-                            if stall_duration > stall_timeout:
-                                print(f"Download appears stalled - file size hasn't changed in {stall_duration:.0f} seconds")
-                                print("Killing the process and trying again...")
-                                process.kill()
-                                break
-                        else:
-                            # File size changed, update tracking variables
-                            last_file_size = current_file_size
-                            last_size_change_time = current_time
-
-                    # Print more frequent progress updates (every 10 seconds)
-                    if current_time - last_progress_time > 10:
-                        print(f"Download in progress... (running for {int(current_time - start_time)} seconds)")
-
-                        # Show detailed download info
-                        if os.path.exists(output_path):
-                            file_size_mb = current_file_size / (1024 * 1024)  # Size in MB
-
-                            # Calculate download speed
-                            elapsed = current_time - start_time
-                            if elapsed > 0:
-                                download_speed_mbps = file_size_mb / elapsed
-                                print(f"Current file size: {file_size_mb:.2f} MB (Speed: {download_speed_mbps:.2f} MB/s)")
-
-                                # Estimate remaining time if we know the expected size (approx 7h at 1080p60)
-                                expected_size_mb = 20000  # ~20GB for 7-8h VOD at high quality
-                                if file_size_mb > 0 and download_speed_mbps > 0:
-                                    remaining_mb = expected_size_mb - file_size_mb
-                                    remaining_sec = remaining_mb / download_speed_mbps
-                                    remaining_min = remaining_sec / 60
-                                    print(f"Estimated time remaining: {remaining_min:.0f} minutes")
-                        else:
-                            print("File not created yet")
-
-                        # List running processes for debugging
-                        print("Checking twitch-dl processes:")
-                        subprocess.run("ps -aux | grep twitch-dl", shell=True)
-
-                        last_progress_time = current_time
-
-                    # Brief sleep to prevent CPU spinning
-                    time.sleep(1)
-
-                # Wait for process to complete
-                return_code = process.wait()
-
-                # Join output threads
-                stdout_thread.join(timeout=1)
-                stderr_thread.join(timeout=1)
-
-                # Combine captured output
-                stdout_content = ''.join(stdout_data)
-                stderr_content = ''.join(stderr_data)
 
                 if return_code == 0:
                     print(f"VOD downloaded to {output_path} with quality {quality}")
@@ -372,7 +401,7 @@ def download_vod(vod_id, force=False):
             print(f"Attempting direct ffmpeg download for VOD {vod_id} with quality {quality_name}")
 
             # First get the m3u8 URL from twitch-dl info
-            info_cmd = ["twitch-dl", "info", vod_id, "--debug"]
+            info_cmd = [TWITCH_DL, "info", vod_id, "--debug"]
             print(f"Getting playlist info: {' '.join(info_cmd)}")
 
             info_result = subprocess.run(
@@ -416,7 +445,7 @@ def download_vod(vod_id, force=False):
 
             # Now use ffmpeg to download
             ffmpeg_cmd = [
-                "ffmpeg", "-i", m3u8_url,
+                FFMPEG, "-i", m3u8_url,
                 "-c", "copy",
                 "-bsf:a", "aac_adtstoasc",
                 output_path
@@ -424,66 +453,7 @@ def download_vod(vod_id, force=False):
 
             print(f"Running ffmpeg command: {' '.join(ffmpeg_cmd)}")
 
-            # Start ffmpeg process
-            process = subprocess.Popen(
-                ffmpeg_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-
-            # Track start time for timeout
-            start_time = time.time()
-            last_progress_time = start_time
-
-            # Variables for stall detection
-            last_file_size = 0
-            last_size_change_time = time.time()
-            stall_timeout = 180  # 3 minutes
-
-            # Monitor the process
-            while process.poll() is None:
-                current_time = time.time()
-
-                # Check for timeout (2 hours)
-                if current_time - start_time > 7200:
-                    print("Download timed out after 2 hours, killing process...")
-                    process.kill()
-                    break
-
-                # Check if file exists and get current size
-                current_file_size = 0
-                if os.path.exists(output_path):
-                    current_file_size = os.path.getsize(output_path)
-
-                # Check for stalled download
-                if current_file_size > 0:
-                    if current_file_size == last_file_size:
-                        stall_duration = current_time - last_size_change_time
-                        if stall_duration > stall_timeout:
-                            print(f"Download appears stalled - file size hasn't changed in {stall_duration:.0f} seconds")
-                            print("Killing the process and trying again...")
-                            process.kill()
-                            break
-                    else:
-                        # File size changed, update tracking variables
-                        last_file_size = current_file_size
-                        last_size_change_time = current_time
-
-                # Print progress updates every 10 seconds
-                if current_time - last_progress_time > 10:
-                    print(f"ffmpeg download in progress... (running for {int(current_time - start_time)} seconds)")
-
-                    if os.path.exists(output_path):
-                        file_size_mb = current_file_size / (1024 * 1024)
-                        print(f"Current file size: {file_size_mb:.2f} MB")
-
-                    last_progress_time = current_time
-
-                time.sleep(1)
-
-            # Wait for process to complete
-            return_code = process.wait()
+            return_code, _, _ = _run_with_monitor(ffmpeg_cmd, output_path, label="ffmpeg download")
 
             if return_code == 0:
                 print(f"ffmpeg download completed successfully")
@@ -497,32 +467,79 @@ def download_vod(vod_id, force=False):
             return False
 
     # First check if the VOD exists (with retries)
-    if not check_vod_exists():
+    available = probe_vod()
+    if available is None:
         raise ValueError(f"VOD {vod_id} not found or inaccessible after multiple attempts")
 
-    # Try downloading with different quality options in case 1080p60 isn't available
+    if available:
+        print(f"Available qualities: {', '.join(sorted(available))}")
+    else:
+        print("Could not parse available qualities, trying all of them")
+
+    # Try downloading with different quality options in case 1080p60 isn't available,
+    # skipping the ones the info probe says this VOD doesn't have
     qualities = ["1080p60", "1080p", "720p60", "720p", "best"]
 
     for quality in qualities:
+        if available and quality != "best" and quality not in available and f"{quality}30" not in available:
+            print(f"Quality {quality} not listed for this VOD, skipping")
+            continue
         if download_with_quality(quality):
+            _publish()
             return output_path
 
     # If twitch-dl failed, try direct ffmpeg download as a fallback
     print("All twitch-dl download attempts failed, trying ffmpeg direct download...")
     for quality in ["1080p60", "720p60", "best"]:
         if download_with_ffmpeg(quality):
+            _publish()
             return output_path
 
     # If all methods failed after all retries
     raise RuntimeError(f"Failed to download VOD {vod_id} with any method after multiple attempts")
 
+# Matches the opening of the comments array after its key, capturing the first
+# non-whitespace byte inside it (b']' for an empty array)
+_COMMENTS_ARRAY_RE = re.compile(rb'\s*:\s*\[\s*(\S)')
+
+def _write_chat_json(path, chat_data):
+    """Write chat JSON compactly; it is only read back by TwitchDownloaderCLI"""
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(chat_data))
+    else:
+        import json
+        with open(path, 'w') as f:
+            json.dump(chat_data, f, separators=(',', ':'))
+
+# Placeholder chat that still lets the renderer run when no real chat can be had
+_MINIMAL_CHAT_TEMPLATE = {
+    "comments": [
+        {"_id": "1", "message": {"body": "Chat unavailable"}, "commenter": {"name": "System"}, "content_offset_seconds": 0},
+        {"_id": "2", "message": {"body": "Please try again later"}, "commenter": {"name": "System"}, "content_offset_seconds": 60},
+        {"_id": "3", "message": {"body": "Using fallback chat mode"}, "commenter": {"name": "System"}, "content_offset_seconds": 120}
+    ],
+    "video": {"id": None, "created_at": "2023-01-01T00:00:00Z", "duration": "36000"},
+    "streamer": {"name": "forsen"},
+    "embeddedData": True
+}
+
+def _minimal_chat(vod_id):
+    """Return the placeholder chat for vod_id; only the video entry is copied"""
+    return {**_MINIMAL_CHAT_TEMPLATE, "video": {**_MINIMAL_CHAT_TEMPLATE["video"], "id": vod_id}}
+
 @app.function(image=image, volumes={"/data": volume}, timeout=7200)
 def download_chat(vod_id, force=False):
     """Download Twitch chat"""
     print(f"Downloading chat for VOD: {vod_id}")
     # Use VOD ID in the filename for better caching
     chat_json_path = f"/data/chat_{vod_id}.json"
-    downloader_path = "/data/bin/TwitchDownloaderCLI"
+    downloader_path = DOWNLOADER_PATH
     max_retries = 3
     
     # Check if chat file already exists and skip download if not forced
@@ -555,23 +572,15 @@ def download_chat(vod_id, force=False):
     elif force:
         print(f"Force download requested for chat from VOD {vod_id}")
 
-    # Check if downloader exists
+    # Verify downloader is present in the image
     if not os.path.exists(downloader_path):
-        print(f"TwitchDownloaderCLI not found at {downloader_path}, downloading...")
-        downloader_path = download_downloader.remote()
-
-    # Verify downloader exists now
-    if not os.path.exists(downloader_path):
-        raise FileNotFoundError(f"TwitchDownloaderCLI still not found at {downloader_path}")
+        raise FileNotFoundError(f"TwitchDownloaderCLI not found at {downloader_path}")
 
     print(f"Using downloader at {downloader_path}")
 
-    # List files for debugging
-    print("Contents of /data/bin directory:")
-    subprocess.run(["ls", "-la", "/data/bin"], check=True)
-
     # Function to validate the JSON file
     def validate_chat_json(file_path):
+        import json
         try:
             # Check file size first
             file_size = os.path.getsize(file_path)
@@ -579,22 +588,44 @@ def download_chat(vod_id, force=False):
                 print(f"Warning: Chat JSON file is suspiciously small ({file_size} bytes)")
                 return False
 
-            # Try to load the JSON to validate it
-            import json
-            with open(file_path, 'r') as f:
-                chat_data = json.load(f)
+            # Scan the memory-mapped file for the structure we need instead of
+            # materializing the whole (often 100MB+) document with json.load
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                comments_idx = mm.find(b'"comments"')
 
-            # Check for required keys in a TwitchDownloaderCLI chat JSON
-            if not all(key in chat_data for key in ['comments', 'video', 'streamer']):
-                print(f"Warning: Chat JSON is missing required keys")
-                return False
+                # Check for required keys in a TwitchDownloaderCLI chat JSON
+                if comments_idx == -1 or mm.find(b'"video"') == -1 or mm.find(b'"streamer"') == -1:
+                    print(f"Warning: Chat JSON is missing required keys")
+                    return False
+
+                # A complete document ends with the top-level closing brace
+                if not mm[-64:].rstrip().endswith(b'}'):
+                    print(f"Error: Chat JSON is not valid JSON")
+                    return False
+
+                # The comments array should open right after its key
+                key_end = comments_idx + len(b'"comments"')
+                array_start = _COMMENTS_ARRAY_RE.match(mm[key_end:key_end + 256])
+
+            if array_start is None:
+                # Unusual layout; let the full parser decide
+                with open(file_path, 'r') as f:
+                    chat_data = json.load(f)
+                if not all(key in chat_data for key in ['comments', 'video', 'streamer']):
+                    print(f"Warning: Chat JSON is missing required keys")
+                    return False
+                if len(chat_data['comments']) == 0:
+                    print(f"Warning: Chat JSON has no comments")
+                    return False
+                print(f"Chat JSON validation successful: {len(chat_data['comments'])} comments found")
+                return True
 
             # Check if there are any comments
-            if 'comments' in chat_data and len(chat_data['comments']) == 0:
+            if array_start.group(1) == b']':
                 print(f"Warning: Chat JSON has no comments")
                 return False
 
-            print(f"Chat JSON validation successful: {len(chat_data.get('comments', []))} comments found")
+            print(f"Chat JSON validation successful ({file_size / 1024:.2f} KB)")
             return True
 
         except json.JSONDecodeError:
@@ -620,7 +651,7 @@ def download_chat(vod_id, force=False):
                 try:
                     # Use ffprobe to get the duration of the VOD
                     duration_cmd = [
-                        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+                        FFPROBE, "-v", "error", "-show_entries", "format=duration",
                         "-of", "default=noprint_wrappers=1:nokey=1", vod_path
                     ]
                     duration_result = subprocess.run(duration_cmd, capture_output=True, text=True, check=False)
@@ -646,80 +677,20 @@ def download_chat(vod_id, force=False):
             
             print(f"Running chat download command: {' '.join(download_cmd)}")
 
-            # Use Popen and monitor with timeout instead of run
-            process = subprocess.Popen(
-                download_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
+            # Monitor with timeout instead of run; the JSON is written in one go at the
+            # end, so size-based stall detection doesn't apply here
+            download_timeout = 7200  # 2 hours for chat download
+            returncode, stdout_text, stderr_text = _run_with_monitor(
+                download_cmd, chat_json_path,
+                overall_timeout=download_timeout,
+                stall_timeout=None,
+                progress_interval=30,
+                label="Chat download",
             )
 
-            # Track progress with timeout
-            stdout_lines = []
-            stderr_lines = []
-            start_time = time.time()
-            download_timeout = 7200  # 20 minutes for chat download
-
-            # Monitor the process
-            print(f"Started chat download process with PID {process.pid}, timeout: {download_timeout}s")
-
-            last_progress_time = start_time
-            last_file_size = 0
-            while process.poll() is None:
-                # Check for timeout
-                current_time = time.time()
-                elapsed = current_time - start_time
-
-                # Print periodic status
-                if current_time - last_progress_time > 30:  # More frequent updates
-                    # Check if file exists and is growing
-                    if os.path.exists(chat_json_path):
-                        print(f"Chat download progress: {int(elapsed)}s elapsed")
-                    else:
-                        print(f"Chat download in progress for {int(elapsed)}s, file not created yet")
-                    last_progress_time = current_time
-
-                # Check for timeout
-                if elapsed > download_timeout:
-                    print(f"⚠️ Chat download timed out after {download_timeout} seconds. Terminating process.")
-                    process.terminate()
-                    time.sleep(1)
-                    if process.poll() is None:
-                        print("Process didn't terminate gracefully, killing it...")
-                        process.kill()
-                    break
-
-                # Check for output
-                stdout_ready = select.select([process.stdout], [], [], 0.1)[0]
-                if stdout_ready:
-                    line = process.stdout.readline()
-                    if line:
-                        stdout_lines.append(line)
-                        print(f"OUT: {line.strip()}")
-
-                stderr_ready = select.select([process.stderr], [], [], 0.1)[0]
-                if stderr_ready:
-                    line = process.stderr.readline()
-                    if line:
-                        stderr_lines.append(line)
-                        print(f"ERR: {line.strip()}")
-
-                # Brief sleep to prevent CPU spinning
-                time.sleep(0.1)
-
-            # Get final output
-            stdout, stderr = process.communicate()
-            if stdout:
-                stdout_lines.append(stdout)
-            if stderr:
-                stderr_lines.append(stderr)
-
-            stdout_text = ''.join(stdout_lines)
-            stderr_text = ''.join(stderr_lines)
-
             # Create a result object similar to what subprocess.run would return
             result = type('', (), {})()
-            result.returncode = process.returncode
+            result.returncode = returncode
             result.stdout = stdout_text
             result.stderr = stderr_text
 
@@ -746,45 +717,45 @@ def download_chat(vod_id, force=False):
             if validate_chat_json(chat_json_path):
                 print(f"✅ Chat downloaded and validated successfully at {chat_json_path}")
                 import json
+                import ijson
 
-                # attempt to load whole file
-                with open(chat_json_path, 'r') as f:
-                    content = f.read()
-
-                try:
-                    chat_data = json.loads(content)
-                except json.JSONDecodeError:
-                    # truncated—drop the last comment and close JSON
-                    last_obj_end = content.rfind("},")
-                    if last_obj_end != -1:
-                        # keep up through the last complete object
-                        fixed = content[: last_obj_end + 1] \
-                                + "\n  ],\n" \
-                                + content[content.find('"video"') - 2:]
-                        try:
-                            chat_data = json.loads(fixed)
-                            with open(chat_json_path, 'w') as f:
-                                json.dump(chat_data, f, indent=2)
-                            print("✅ Truncated JSON repaired by dropping last comment.")
-                        except json.JSONDecodeError:
-                            fixed = None
-                    if last_obj_end == -1 or not fixed:
+                # Stream the comments one at a time; a parse error means the
+                # download was truncated partway through the array
+                comments = []
+                truncated = False
+                with open(chat_json_path, 'rb') as f:
+                    try:
+                        for comment in ijson.items(f, 'comments.item', use_float=True):
+                            comments.append(comment)
+                    except ijson.JSONError:
+                        truncated = True
+
+                if truncated:
+                    # TwitchDownloaderCLI writes video/streamer ahead of the comments, so
+                    # these stop reading as soon as the key is found
+                    def first_item(prefix):
+                        with open(chat_json_path, 'rb') as f:
+                            try:
+                                return next(ijson.items(f, prefix, use_float=True), None)
+                            except ijson.JSONError:
+                                return None
+
+                    video = first_item('video')
+                    streamer = first_item('streamer')
+
+                    if comments and video is not None:
+                        # keep every complete comment and close the JSON
+                        chat_data = {'comments': comments, 'video': video, 'streamer': streamer, 'embeddedData': True}
+                        _write_chat_json(chat_json_path, chat_data)
+                        print(f"✅ Truncated JSON repaired, kept {len(comments)} complete comments.")
+                    else:
                         # fallback minimal JSON
-                        chat_data = {
-                            "comments": [
-                                {"_id": "1", "message": {"body": "Chat unavailable"}, "commenter": {"name": "System"},
-                                 "content_offset_seconds": 0},
-                            ],
-                            "video": {"id": vod_id, "created_at": "2023-01-01T00:00:00Z", "duration": "36000"},
-                            "streamer": {"name": "streamer"},
-                            "embeddedData": True
-                        }
-                        with open(chat_json_path, 'w') as f:
-                            json.dump(chat_data, f, indent=2)
+                        _write_chat_json(chat_json_path, _minimal_chat(vod_id))
                         print("⚠️ Couldn’t repair JSON; wrote minimal fallback.")
                 # end of repair
 
                 # now finally return
+                _publish()
                 return chat_json_path
             else:
                 print(f"⚠️ Chat validation failed, retrying...")
@@ -819,9 +790,14 @@ def download_chat(vod_id, force=False):
 
                     if os.path.exists(alt_path) and validate_chat_json(alt_path):
                         print(f"✅ Alternative chat download successful at {alt_path}")
-                        # Copy to the expected path
-                        import shutil
-                        shutil.copy2(alt_path, chat_json_path)
+                        # Move into place with a rename; only copy if the paths are on different filesystems
+                        try:
+                            os.replace(alt_path, chat_json_path)
+                        except OSError as move_err:
+                            if move_err.errno != errno.EXDEV:
+                                raise
+                            shutil.copy2(alt_path, chat_json_path)
+                        _publish()
                         return chat_json_path
                     else:
                         print("❌ Alternative download produced an invalid file or failed")
@@ -834,22 +810,10 @@ def download_chat(vod_id, force=False):
                 print("All standard methods failed, creating minimal chat data...")
                 try:
                     # Create a minimal valid JSON that allows the renderer to run
-                    minimal_chat = {
-                        "comments": [
-                            {"_id": "1", "message": {"body": "Chat unavailable"}, "commenter": {"name": "System"}, "content_offset_seconds": 0},
-                            {"_id": "2", "message": {"body": "Please try again later"}, "commenter": {"name": "System"}, "content_offset_seconds": 60},
-                            {"_id": "3", "message": {"body": "Using fallback chat mode"}, "commenter": {"name": "System"}, "content_offset_seconds": 120}
-                        ],
-                        "video": {"id": vod_id, "created_at": "2023-01-01T00:00:00Z", "duration": "36000"},
-                        "streamer": {"name": "forsen"},
-                        "embeddedData": True
-                    }
-
-                    with open(chat_json_path, 'w') as f:
-                        import json
-                        json.dump(minimal_chat, f, indent=2)
+                    _write_chat_json(chat_json_path, _minimal_chat(vod_id))
 
                     print(f"Created minimal chat JSON file at {chat_json_path}")
+                    _publish()
                     return chat_json_path
                 except Exception as fallback_err:
                     print(f"Fallback method also failed: {fallback_err}")
@@ -862,199 +826,326 @@ def download_chat(vod_id, force=False):
     # If we get here, all attempts failed
     raise RuntimeError(f"Failed to download chat for VOD {vod_id} after {max_retries} attempts")
 
-@app.function(image=image, cpu=8.0, memory=32768, volumes={"/data": volume}, timeout=7200)
-def render_chat(vod_id, force=True):
-    """Render chat to video with GPU acceleration"""
-    print(f"Rendering chat to video for VOD {vod_id} with GPU acceleration")
-    # Use VOD ID in the filenames for better caching
-    chat_json_path = f"/data/chat_{vod_id}.json"
-    output_path = f"/data/chat_{vod_id}.mp4"
-    downloader_path = "/data/bin/TwitchDownloaderCLI"
-    max_retries = 3
+# TwitchDownloaderCLI --version / chatrender --help results keyed by binary
+# path; each entry is (key, version_str, available_options)
+_DOWNLOADER_META_CACHE = {}
 
-    # Check if chat video already exists and skip rendering if not forced
-    if os.path.exists(output_path) and not force:
-        file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-        print(f"Chat video already exists at {output_path} ({file_size_mb:.2f} MB)")
+# Probe results shared across containers through the volume
+DOWNLOADER_META_PATH = "/data/.downloader_meta.json"
 
-        # Check if file size is reasonable (>5MB) to ensure it's a valid video
-        if file_size_mb > 5:
-            print(f"Using existing chat video. Use force=True to re-render.")
-            return output_path
-        else:
-            print(f"Existing chat video is too small ({file_size_mb:.2f} MB), will re-render")
+def _probe_downloader(downloader_path):
+    """Return (version_str, available_options) for TwitchDownloaderCLI.
 
-    # Remove existing file to avoid overwrite prompts
-    if os.path.exists(output_path):
+    Results are memoized per binary size+mtime in this container and persisted
+    to the volume, so later cold containers skip the probe subprocesses too.
+    Two containers starting together may both probe; the last write wins.
+    """
+    import json
+
+    st = os.stat(downloader_path)
+    key = f"{st.st_size}:{int(st.st_mtime)}"
+    cached = _DOWNLOADER_META_CACHE.get(downloader_path)
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+
+    try:
+        with open(DOWNLOADER_META_PATH) as f:
+            meta = json.load(f)
+        if meta.get("path") == downloader_path and meta.get("key") == key:
+            _DOWNLOADER_META_CACHE[downloader_path] = (key, meta["version_str"], meta["available_options"])
+            return meta["version_str"], meta["available_options"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Get help info to understand available commands
+    version_cmd = subprocess.run([downloader_path, "--version"], capture_output=True, text=True)
+    help_cmd = subprocess.run([downloader_path, "chatrender", "--help"], capture_output=True, text=True)
+
+    # Extract version and help info
+    version_str = version_cmd.stdout.strip() if version_cmd.returncode == 0 else "unknown"
+    help_text = help_cmd.stdout if help_cmd.returncode == 0 else ""
+    print(f"Available chatrender options (first 200 chars):\n{help_text[:200]}...")
+
+    # Parse available options from help text
+    available_options = []
+    for line in help_text.splitlines():
+        if line.strip().startswith("--") or line.strip().startswith("-"):
+            available_options.append(line.strip().split()[0])
+
+    _DOWNLOADER_META_CACHE[downloader_path] = (key, version_str, available_options)
+
+    # Write-then-rename so readers never see a half-written file
+    tmp_path = f"{DOWNLOADER_META_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"path": downloader_path, "key": key, "version_str": version_str,
+                       "available_options": available_options}, f)
+        os.replace(tmp_path, DOWNLOADER_META_PATH)
+    except OSError as e:
+        print(f"Could not save TwitchDownloaderCLI probe results: {e}")
         try:
-            os.remove(output_path)
-            print(f"Removed existing chat video at {output_path}")
-        except Exception as e:
-            print(f"Error removing existing chat video: {e}")
+            os.unlink(tmp_path)
+        except OSError:
+            pass
 
-    if force:
-        print(f"Force render requested for chat video")
+    return version_str, available_options
+
+@functools.lru_cache(maxsize=1)
+def _probe_gpu_env():
+    """Run the GPU/CUDA/NVENC probes once per container and return their output.
+
+    These don't change for the lifetime of a container, so repeat renders and
+    retries reuse the first result. Missing tools are reported as None.
+    """
+    env = {"nvidia_smi": None, "nvidia_smi_q": None, "nvcc": None, "cuda_libs": None, "nvenc": None}
+
+    # Check if nvidia-smi is available
+    if shutil.which("nvidia-smi"):
+        env["nvidia_smi"] = subprocess.run(["nvidia-smi"], capture_output=True, text=True).stdout
+        env["nvidia_smi_q"] = subprocess.run(["nvidia-smi", "-q"], capture_output=True, text=True).stdout
+    else:
+        # Install nvidia-smi if missing
+        if subprocess.run(["apt-get", "update"]).returncode == 0:
+            subprocess.run(["apt-get", "install", "-y", "nvidia-utils-525"])
+
+    if shutil.which("nvcc"):
+        env["nvcc"] = subprocess.run(["nvcc", "--version"], capture_output=True, text=True).stdout
+    else:
+        env["nvcc"] = "nvcc not found"
+
+    # Filter in Python rather than piping through grep in a shell
+    ldconfig = subprocess.run(["ldconfig", "-p"], capture_output=True, text=True)
+    cuda_libs = [line for line in ldconfig.stdout.splitlines() if "cuda" in line.lower()]
+    if cuda_libs:
+        env["cuda_libs"] = "\n".join(cuda_libs)
+
+    encoders = subprocess.run([FFMPEG, "-hide_banner", "-encoders"], capture_output=True, text=True)
+    nvenc_lines = [line for line in encoders.stdout.splitlines() if "nvenc" in line]
+    if nvenc_lines:
+        env["nvenc"] = "\n".join(nvenc_lines).strip()
+
+    return env
+
+# Chat render progress, e.g. "[STATUS] - Rendering Video 0% (0h0m8s Elapsed | 1h21m17s Remaining)"
+_RENDERING_SENT = "Rendering Video"
+_REMAINING_RE = re.compile(r'(\d+)h(\d+)m(\d+)s Remaining')
+_GPU_MODEL_RE = re.compile(r"NVIDIA\s+([A-Za-z0-9\s]+)")
+
+# Set once the GPU diagnostics have been printed in this container
+_gpu_diag_done = False
+
+def _gpu_diagnostics():
+    """Print GPU/CUDA/NVENC diagnostics the first time it's called in a container"""
+    global _gpu_diag_done
+    if _gpu_diag_done:
+        return
+    _gpu_diag_done = True
 
-    # Verify GPU is available and visible to the container
     try:
         print("Checking GPU availability...")
-        # Check if nvidia-smi is available
-        nvidia_smi = subprocess.run("which nvidia-smi", shell=True, capture_output=True, text=True)
-        if nvidia_smi.returncode == 0:
-            # Run nvidia-smi to check GPU
-            gpu_info = subprocess.run("nvidia-smi", shell=True, capture_output=True, text=True)
-            print(f"GPU Info:\n{gpu_info.stdout}")
-
-            # Run nvidia-smi with more detailed information
-            gpu_details = subprocess.run("nvidia-smi -q", shell=True, capture_output=True, text=True)
-            print(f"Detailed GPU Info (first 500 chars):\n{gpu_details.stdout[:500]}...")
-
-            if "L40S" in gpu_info.stdout:
+        gpu_env = _probe_gpu_env()
+        if gpu_env["nvidia_smi"] is not None:
+            gpu_info = gpu_env["nvidia_smi"]
+            print(f"GPU Info:\n{gpu_info}")
+            print(f"Detailed GPU Info (first 500 chars):\n{gpu_env['nvidia_smi_q'][:500]}...")
+
+            if "L40S" in gpu_info:
                 print("✅ NVIDIA L40S GPU detected! Using for acceleration.")
             else:
                 print("⚠️ WARNING: L40S GPU not detected in nvidia-smi output!")
                 # Try to detect what GPU we do have
-                if "NVIDIA" in gpu_info.stdout:
+                if "NVIDIA" in gpu_info:
                     # Try to extract GPU model
-                    import re
-                    gpu_model_match = re.search(r"NVIDIA\s+([A-Za-z0-9\s]+)", gpu_info.stdout)
+                    gpu_model_match = _GPU_MODEL_RE.search(gpu_info)
                     if gpu_model_match:
                         gpu_model = gpu_model_match.group(1).strip()
                         print(f"Detected GPU model: {gpu_model}")
         else:
             print("⚠️ WARNING: nvidia-smi not found, GPU may not be properly configured")
-            # Install nvidia-smi if missing
-            subprocess.run("apt-get update && apt-get install -y nvidia-utils-525", shell=True)
 
         # Check CUDA capabilities
         print("Checking CUDA configuration...")
-        cuda_version = subprocess.run("nvcc --version 2>/dev/null || echo 'nvcc not found'",
-                                    shell=True, capture_output=True, text=True)
-        print(f"CUDA Compiler:\n{cuda_version.stdout}")
+        print(f"CUDA Compiler:\n{gpu_env['nvcc']}")
+
+        # Also verify GPU drivers are loaded
+        if gpu_env["cuda_libs"]:
+            print("CUDA libraries detected:")
+            print(gpu_env["cuda_libs"][:500])  # Show first 500 chars
+        else:
+            print("⚠️ WARNING: CUDA libraries not detected! GPU acceleration may not work.")
+
+        if gpu_env["nvenc"]:
+            print(f"NVENC encoders found: {gpu_env['nvenc']}")
+        else:
+            print("⚠️ No NVENC encoders detected in FFmpeg!")
 
     except Exception as e:
         print(f"Error checking GPU: {e}")
         print("Continuing with render attempt despite GPU check failure")
 
-    # Check if downloader exists
-    if not os.path.exists(downloader_path):
-        print(f"TwitchDownloaderCLI not found at {downloader_path}, downloading...")
-        downloader_path = download_downloader.remote()
+def _probe_duration(path):
+    """Return the container duration of a media file in seconds, or None if it can't be probed"""
+    try:
+        result = subprocess.run(
+            [FFPROBE, "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", path],
+            capture_output=True, text=True, check=False
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return float(result.stdout.strip())
+    except Exception as e:
+        print(f"Error getting duration of {path}: {e}")
+    return None
+
+# ffmpeg output arguments for streaming the chat render as raw frames into a pipe
+FUSED_CHAT_OUTPUT_ARGS = '-c:v rawvideo -pix_fmt yuv420p -f nut -y "{save_path}"'
+
+# How far (seconds) the fused combine may still be from the end of the VOD when
+# the chat render exits with an error for that to count as the EPIPE of a combine
+# that stopped reading. Past that the render died mid-stream, and hstack would
+# carry on with the last chat frame frozen. ffmpeg's stats only come twice a
+# second, so at GPU speeds the last one can trail the encode by several seconds
+FUSED_RENDER_EXIT_SLACK = 30
+
+_STATS_TIME_RE = re.compile(r'time=(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+# Chat render settings; they are also part of the render cache key
+CHAT_RENDER_HEIGHT = 1080
+CHAT_RENDER_WIDTH = 422
+CHAT_RENDER_FPS = 5
+CHAT_RENDER_FONT_SIZE = 18
+
+# Rendered chat videos keyed by chat content and render settings, shared across VODs and reruns
+CHAT_CACHE_DIR = "/data/cache"
+
+def _chat_cache_path(chat_json_path, vod_duration=None):
+    """Return the render cache path for a chat JSON file and the current render settings"""
+    with open(chat_json_path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            digest = hashlib.file_digest(f, "sha256")
+        else:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(COPY_BUFSIZE), b""):
+                digest.update(chunk)
+    key = (f"{digest.hexdigest()[:16]}_{CHAT_RENDER_HEIGHT}x{CHAT_RENDER_WIDTH}"
+           f"_{CHAT_RENDER_FPS}_{CHAT_RENDER_FONT_SIZE}")
+    # The render is cut at the VOD length, so that is part of the output too
+    if vod_duration:
+        key += f"_e{int(vod_duration)}"
+    return os.path.join(CHAT_CACHE_DIR, f"{key}.mp4")
+
+def _chatrender_cmd(downloader_path, chat_json_path, output_path, vod_duration=None,
+                    version_str=None, output_args=None):
+    """Build the TwitchDownloaderCLI chatrender command line"""
+    cmd = [
+        downloader_path, "chatrender",
+        "-i", chat_json_path,
+        "-h", str(CHAT_RENDER_HEIGHT),
+        "-w", str(CHAT_RENDER_WIDTH),
+        "--framerate", str(CHAT_RENDER_FPS),
+        "--font-size", str(CHAT_RENDER_FONT_SIZE),
+        "--update-rate", "0.5",  # Update less frequently for speed
+        "--offline",
+    ]
 
-    # Remove previous chat video if it exists to avoid prompts
-    if os.path.exists(output_path):
-        print(f"Removing existing chat video at {output_path}")
-        os.remove(output_path)
+    # End the render at the VOD length
+    if vod_duration:
+        cmd.extend(["-e", str(int(vod_duration))])
 
-    # Try multiple methods for rendering
-    for attempt in range(max_retries):
-        try:
-            print(f"Rendering chat (Attempt {attempt+1}/{max_retries})")
+    if output_args:
+        cmd.extend(["--output-args", output_args])
 
-            # Determine render method based on attempt
-            # Build command based on attempt
-            # Check TwitchDownloaderCLI version and get help information
-            try:
-                # Get help info to understand available commands
-                version_cmd = subprocess.run([downloader_path, "--version"], capture_output=True, text=True)
-                help_cmd = subprocess.run([downloader_path, "chatrender", "--help"], capture_output=True, text=True)
+    # Version 1.55.5 takes an uppercase -O output flag
+    output_flag = "-O" if version_str and "1.55.5" in version_str else "-o"
+    cmd.extend([
+        output_flag, output_path,
+        "--collision", "Overwrite"
+    ])
+    return cmd
 
-                # Extract version and help info
-                version_str = version_cmd.stdout.strip() if version_cmd.returncode == 0 else "unknown"
-                help_text = help_cmd.stdout if help_cmd.returncode == 0 else ""
+@app.function(image=image, cpu=8.0, memory=32768, volumes={"/data": volume}, timeout=7200)
+def render_chat(vod_id, force=True):
+    """Render chat to video with GPU acceleration"""
+    print(f"Rendering chat to video for VOD {vod_id} with GPU acceleration")
+    # Use VOD ID in the filenames for better caching
+    chat_json_path = f"/data/chat_{vod_id}.json"
+    output_path = f"/data/chat_{vod_id}.mp4"
+    downloader_path = DOWNLOADER_PATH
+    max_retries = 3
 
-                print(f"TwitchDownloaderCLI version: {version_str}")
-                print(f"Available chatrender options (first 200 chars):\n{help_text[:200]}...")
+    # See the files the download stages committed, even in a warm container
+    volume.reload()
 
-                # Parse available options from help text
-                available_options = []
-                for line in help_text.splitlines():
-                    if line.strip().startswith("--") or line.strip().startswith("-"):
-                        available_options.append(line.strip().split()[0])
+    # Check if chat video already exists and skip rendering if not forced
+    if os.path.exists(output_path) and not force:
+        file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+        print(f"Chat video already exists at {output_path} ({file_size_mb:.2f} MB)")
 
-                print(f"Detected available options: {available_options[:10]}...")
+        # Check if file size is reasonable (>5MB) to ensure it's a valid video
+        if file_size_mb > 5:
+            print(f"Using existing chat video. Use force=True to re-render.")
+            _write_manifest(vod_id, "chat_video", output_path, os.path.getsize(output_path))
+            _publish()
+            return output_path
+        else:
+            print(f"Existing chat video is too small ({file_size_mb:.2f} MB), will re-render")
 
-            except Exception as e:
-                print(f"Error checking TwitchDownloaderCLI capabilities: {e}")
-                available_options = []
-                has_gpu_accel = False
+    # Remove existing file to avoid overwrite prompts
+    try:
+        os.unlink(output_path)
+        print(f"Removed existing chat video at {output_path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error removing existing chat video: {e}")
+    _write_manifest(vod_id, "chat_video", None)
 
-            # Also verify GPU drivers are loaded
-            try:
-                # Check for CUDA availability
-                cuda_check = subprocess.run("ldconfig -p | grep -i cuda", shell=True, capture_output=True, text=True)
-                if cuda_check.returncode == 0 and cuda_check.stdout:
-                    print("CUDA libraries detected:")
-                    print(cuda_check.stdout[:500])  # Show first 500 chars
-                else:
-                    print("⚠️ WARNING: CUDA libraries not detected! GPU acceleration may not work.")
-            except Exception as e:
-                print(f"Error checking CUDA: {e}")
+    if force:
+        print(f"Force render requested for chat video")
 
-            # First check if NVENC is actually available
-            nvenc_available = False
-            try:
-                nvenc_check = subprocess.run("ffmpeg -encoders | grep nvenc", shell=True, capture_output=True, text=True)
-                if nvenc_check.returncode == 0 and nvenc_check.stdout.strip():
-                    print(f"NVENC encoders found: {nvenc_check.stdout.strip()}")
-                    nvenc_available = True
-                else:
-                    print("⚠️ No NVENC encoders detected in FFmpeg!")
-            except Exception as e:
-                print(f"Error checking NVENC availability: {e}")
+    # Get the VOD file length to set an appropriate ending time
+    vod_path = f"/data/vod_{vod_id}.mp4"
+    vod_duration = _probe_duration(vod_path) if os.path.exists(vod_path) else None
+    if vod_duration:
+        print(f"VOD duration detected: {vod_duration:.2f} seconds")
+        print(f"Setting chat render ending time to match VOD length: {int(vod_duration)}s")
 
-            if attempt != -1:
-                # First attempt: Choose appropriate encoder based on NVENC availability
-                cmd = [
-                    downloader_path, "chatrender",
-                    "-i", chat_json_path,
-                    "-h", "1080",
-                    "-w", "422",
-                    "--framerate", "5",
-                    "--font-size", "18",
-                    "--update-rate", "0.5",  # Update less frequently for speed
-                    "--offline",
-                ]
+    # Reuse an earlier render of the same chat with the same settings
+    cache_path = None
+    try:
+        cache_path = _chat_cache_path(chat_json_path, vod_duration)
+        if os.path.getsize(cache_path) > 5 * 1024 * 1024:
+            link_or_copy(cache_path, output_path)
+            print(f"♻️ Reusing cached chat render {cache_path}")
+            _write_manifest(vod_id, "chat_video", output_path, os.path.getsize(output_path))
+            _publish()
+            return output_path
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Chat render cache unavailable: {e}")
 
-                # Get the VOD file length to set an appropriate ending time
-                vod_path = f"/data/vod_{vod_id}.mp4"
-                vod_duration = None
-                if os.path.exists(vod_path):
-                    try:
-                        # Use ffprobe to get the duration of the VOD
-                        duration_cmd = [
-                            "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                            "-of", "default=noprint_wrappers=1:nokey=1", vod_path
-                        ]
-                        duration_result = subprocess.run(duration_cmd, capture_output=True, text=True, check=False)
-                        if duration_result.returncode == 0 and duration_result.stdout.strip():
-                            vod_duration = float(duration_result.stdout.strip())
-                            print(f"VOD duration detected: {vod_duration:.2f} seconds")
-                    except Exception as e:
-                        print(f"Error getting VOD duration: {e}")
-
-                # Remove NVENC encoding as it's proven not to work for chat rendering
-                print("Using CPU-only encoding for chat rendering (NVENC not compatible)")
-
-                # Add ending time parameter if we got the VOD duration
-                if vod_duration:
-                    cmd.append(f"-e {int(vod_duration)}s")
-                    print(f"Setting chat render ending time to match VOD length: {int(vod_duration)}s")
-
-                cmd.extend([
-                    "-o", output_path,
-                    "--collision", "Overwrite"
-                ])
+    # Verify GPU is available and visible to the container (once per container)
+    _gpu_diagnostics()
+
+    # Check TwitchDownloaderCLI version and get help information once, not per attempt
+    try:
+        version_str, available_options = _probe_downloader(downloader_path)
+        print(f"TwitchDownloaderCLI version: {version_str}")
+        print(f"Detected available options: {available_options[:10]}...")
+    except Exception as e:
+        print(f"Error checking TwitchDownloaderCLI capabilities: {e}")
+        version_str = "unknown"
+        available_options = []
 
-                print(f"Running GPU-accelerated render command: {' '.join(cmd)}")
+    # Try multiple methods for rendering
+    for attempt in range(max_retries):
+        try:
+            print(f"Rendering chat (Attempt {attempt+1}/{max_retries})")
 
-            # Try to detect if version requires uppercase -O instead of lowercase -o
-            if version_str and "1.55.5" in version_str:
-                # Replace all instances of -o with -O in the command
-                for i in range(len(cmd)):
-                    if cmd[i] == "-o":
-                        cmd[i] = "-O"
-                        print("Using uppercase -O output flag for version 1.55.5")
+            # Remove NVENC encoding as it's proven not to work for chat rendering
+            print("Using CPU-only encoding for chat rendering (NVENC not compatible)")
+            cmd = _chatrender_cmd(downloader_path, chat_json_path, output_path, vod_duration, version_str)
 
             print(f"Final render command: {' '.join(cmd)}")
 
@@ -1063,116 +1154,149 @@ def render_chat(vod_id, force=True):
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                universal_newlines=True
+                bufsize=0
             )
 
             # Track start time and set up monitoring variables
-            start_time = time.time()
+            start_time = time.monotonic()
             last_progress_time = start_time
             last_output_time = start_time
-            last_file_size = 0 if os.path.exists(output_path) else 0
+            last_file_size = 0
             render_timeout = 1800  # 30 minutes max for rendering
 
             # Output collection
             stdout_lines = []
             stderr_lines = []
 
+            # Watch both pipes with one selector; its timeout is the loop's sleep
+            out_fd = process.stdout.fileno()
+            err_fd = process.stderr.fileno()
+            sel = selectors.DefaultSelector()
+            for fd, tag in ((out_fd, "OUT"), (err_fd, "ERR")):
+                os.set_blocking(fd, False)
+                sel.register(fd, selectors.EVENT_READ, tag)
+            pending = {out_fd: bytearray(), err_fd: bytearray()}
+            captured = {"OUT": stdout_lines, "ERR": stderr_lines}
+
+            # Echo child output in batches; per-line prints are costly through Modal's log forwarder
+            log_buf = deque(maxlen=200)
+            last_flush = start_time
+
+            def flush_log():
+                if log_buf:
+                    sys.stdout.write(''.join(f"{tag}: {text}" for tag, text in log_buf))
+                    sys.stdout.flush()
+                    log_buf.clear()
+
             # Monitor the render process
-            while process.poll() is None:
-                # Check for timeout
-                current_time = time.time()
-                elapsed = current_time - start_time
-
-                # Check for overall timeout
-                if elapsed > render_timeout:
-                    print(f"⚠️ Chat render timed out after {render_timeout} seconds. Terminating process.")
-                    process.terminate()
-                    time.sleep(1)
-                    if process.poll() is None:
-                        process.kill()
-                    break
-
-                # Check for output and progress
-                stdout_ready = select.select([process.stdout], [], [], 0.1)[0]
-                if stdout_ready:
-                    line = process.stdout.readline()
-                    if line:
-                        stdout_lines.append(line)
-                        print(f"OUT: {line.strip()}")
-                        last_output_time = current_time
-
-                stderr_ready = select.select([process.stderr], [], [], 0.1)[0]
-                if stderr_ready:
-                    line = process.stderr.readline()
-                    if line:
-                        stderr_lines.append(line)
-                        print(f"ERR: {line.strip()}")
-                        last_output_time = current_time
-
-                        # Check for unreasonable progress estimate
-                        if "Rendering Video" in line and "Remaining" in line:
-                            # Parse the remaining time estimate
-                            try:
-                                # Extract remaining time from format like: "[STATUS] - Rendering Video 0% (0h0m8s Elapsed | 1h21m17s Remaining)"
-                                import re
-                                remaining_match = re.search(r'(\d+)h(\d+)m(\d+)s Remaining', line)
-                                if remaining_match:
-                                    hours = int(remaining_match.group(1))
-                                    minutes = int(remaining_match.group(2))
-                                    seconds = int(remaining_match.group(3))
-                                    total_remaining_seconds = hours * 3600 + minutes * 60 + seconds
-
-                                    # Log the estimated time
-                                    print(f"Render estimates {hours}h {minutes}m {seconds}s remaining")
-
-                                    # If remaining time is over 30 minutes and we're still at early percentage, abort and try a faster method
-                                    if total_remaining_seconds > 1800 and "0%" in line and elapsed < 60:
-                                        print(f"⚠️ Render estimates excessive time ({hours}h {minutes}m {seconds}s). Aborting to try faster method.")
-                                        process.terminate()
-                                        time.sleep(1)
-                                        if process.poll() is None:
-                                            process.kill()
-                                        return False  # Signal to try next method
-                            except Exception as e:
-                                print(f"Error parsing render progress: {e}")
-
-                # Print periodic status updates about the rendering progress
-                if current_time - last_progress_time > 10:  # Every 10 seconds
-                    # Check output file growth as an indicator of progress
-                    if os.path.exists(output_path):
-                        current_file_size = os.path.getsize(output_path)
-                        file_size_mb = current_file_size / (1024 * 1024)
-
-                        # Calculate growth rate
-                        size_diff_mb = (current_file_size - last_file_size) / (1024 * 1024)
-                        time_diff = current_time - last_progress_time
-                        render_speed = size_diff_mb / time_diff if time_diff > 0 else 0
-
-                        print(f"Chat render progress: {int(elapsed)}s elapsed, file size: {file_size_mb:.2f} MB (Speed: {render_speed:.2f} MB/s)")
-
-                        # Update for next iteration
-                        last_file_size = current_file_size
-                    else:
-                        print(f"Chat render in progress for {int(elapsed)}s, output file not created yet")
+            try:
+                while process.poll() is None:
+                    # Check for timeout
+                    current_time = time.monotonic()
+                    elapsed = current_time - start_time
 
-                        # Check if process seems stalled (no output for a while)
-                        if current_time - last_output_time > 120:  # 2 minutes with no output
-                            print("⚠️ Render process may be stalled (no output for 2 minutes)")
+                    # Check for overall timeout
+                    if elapsed > render_timeout:
+                        print(f"⚠️ Chat render timed out after {render_timeout} seconds. Terminating process.")
+                        _stop_process(process)
+                        break
 
-                    last_progress_time = current_time
+                    # Check for output and progress
+                    for key, _ in sel.select(timeout=1.0):
+                        try:
+                            lines, eof = _read_pipe_lines(key.fd, pending[key.fd])
+                        except BlockingIOError:
+                            continue
+                        if eof:
+                            sel.unregister(key.fd)
+
+                        for line in lines:
+                            captured[key.data].append(line)
+                            if "Error" in line or "Fail" in line:
+                                # Always surface errors straight away
+                                flush_log()
+                                print(f"{key.data}: {line.strip()}")
+                            else:
+                                log_buf.append((key.data, line))
+                            last_output_time = current_time
+
+                            # Check for unreasonable progress estimate
+                            if key.data == "ERR" and _RENDERING_SENT in line and "Remaining" in line:
+                                # Parse the remaining time estimate
+                                try:
+                                    remaining_match = _REMAINING_RE.search(line)
+                                    if remaining_match:
+                                        hours = int(remaining_match.group(1))
+                                        minutes = int(remaining_match.group(2))
+                                        seconds = int(remaining_match.group(3))
+                                        total_remaining_seconds = hours * 3600 + minutes * 60 + seconds
+
+                                        # Log the estimated time
+                                        print(f"Render estimates {hours}h {minutes}m {seconds}s remaining")
+
+                                        # If remaining time is over 30 minutes and we're still at early percentage, abort and try a faster method
+                                        if total_remaining_seconds > 1800 and "0%" in line and elapsed < 60:
+                                            print(f"⚠️ Render estimates excessive time ({hours}h {minutes}m {seconds}s). Aborting to try faster method.")
+                                            _stop_process(process)
+                                            return False  # Signal to try next method
+                                except Exception as e:
+                                    print(f"Error parsing render progress: {e}")
+
+                    if current_time - last_flush >= 5:
+                        flush_log()
+                        last_flush = current_time
+
+                    # Print periodic status updates about the rendering progress
+                    if current_time - last_progress_time > 10:  # Every 10 seconds
+                        # Check output file growth as an indicator of progress
+                        try:
+                            current_file_size = os.stat(output_path).st_size
+                            file_size_mb = current_file_size / (1024 * 1024)
 
-                # Brief sleep to prevent CPU spinning
-                time.sleep(0.1)
+                            # Calculate growth rate
+                            size_diff_mb = (current_file_size - last_file_size) / (1024 * 1024)
+                            time_diff = current_time - last_progress_time
+                            render_speed = size_diff_mb / time_diff if time_diff > 0 else 0
+
+                            print(f"Chat render progress: {int(elapsed)}s elapsed, file size: {file_size_mb:.2f} MB (Speed: {render_speed:.2f} MB/s)")
+
+                            # Update for next iteration
+                            last_file_size = current_file_size
+                        except FileNotFoundError:
+                            print(f"Chat render in progress for {int(elapsed)}s, output file not created yet")
+
+                            # Check if process seems stalled (no output for a while)
+                            if current_time - last_output_time > 120:  # 2 minutes with no output
+                                print("⚠️ Render process may be stalled (no output for 2 minutes)")
+
+                        last_progress_time = current_time
+
+                # The pipes are already non-blocking; drain what's left instead of
+                # a communicate() pass that can block on a killed renderer
+                for key in list(sel.get_map().values()):
+                    try:
+                        eof = False
+                        while not eof:
+                            lines, eof = _read_pipe_lines(key.fd, pending[key.fd])
+                            captured[key.data].extend(lines)
+                    except BlockingIOError:
+                        pass
+            finally:
+                sel.close()
+                flush_log()
 
             # If we get here, process completed normally or was killed
-            # Get return code and remaining output
-            return_code = process.poll()
-            stdout, stderr = process.communicate()
+            try:
+                return_code = process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                return_code = process.wait()
+            process.stdout.close()
+            process.stderr.close()
 
-            if stdout:
-                stdout_lines.append(stdout)
-            if stderr:
-                stderr_lines.append(stderr)
+            # Keep any partial last line that never got a newline
+            stdout_lines.append(pending[out_fd].decode(errors='replace'))
+            stderr_lines.append(pending[err_fd].decode(errors='replace'))
 
             # Combine captured output
             stdout_content = ''.join(stdout_lines)
@@ -1191,6 +1315,17 @@ def render_chat(vod_id, force=True):
             else:
                 # Command succeeded
                 print(f"Chat rendered successfully to {output_path}")
+                if cache_path:
+                    try:
+                        os.makedirs(CHAT_CACHE_DIR, exist_ok=True)
+                        # Link under a temp name and rename so a stale entry gets replaced
+                        tmp_cache_path = f"{cache_path}.{os.getpid()}"
+                        link_or_copy(output_path, tmp_cache_path)
+                        os.replace(tmp_cache_path, cache_path)
+                    except OSError as e:
+                        print(f"Could not cache chat render: {e}")
+                _write_manifest(vod_id, "chat_video", output_path, os.path.getsize(output_path))
+                _publish()
                 return output_path
 
         except Exception as e:
@@ -1201,15 +1336,258 @@ def render_chat(vod_id, force=True):
     # If we get here, all attempts failed
     raise RuntimeError("Failed to render chat video after multiple attempts")
 
+# Codecs and pixel formats NVDEC can decode straight into CUDA frames
+NVDEC_CODECS = {"h264", "hevc"}
+NVDEC_PIX_FMTS = {"yuv420p", "yuvj420p", "nv12", "yuv420p10le", "p010le"}
+
+def _probe_stream(path, stream, entries):
+    """Return the requested ffprobe stream entries for one stream as a dict (empty if probing fails)"""
+    result = subprocess.run(
+        [FFPROBE, "-v", "error", "-select_streams", stream,
+         "-show_entries", f"stream={','.join(entries)}",
+         "-of", "default=noprint_wrappers=1", path],
+        capture_output=True, text=True, check=False
+    )
+    info = {}
+    if result.returncode == 0:
+        for line in result.stdout.splitlines():
+            key, _, value = line.partition("=")
+            if key in entries:
+                info[key] = value.strip()
+    return info
+
+# Trim to the shorter input in the muxer; plain -shortest interleaves poorly with a copied track
+SHORTEST_ARGS = ["-fflags", "+shortest", "-max_interleave_delta", "100M"]
+
+# Throughput-oriented NVENC settings: low-latency tune, constant bitrate and
+# no lookahead/multipass/B-frame references/AQ, since the output is a
+# side-by-side archive rather than a quality-critical encode
+NVENC_ARGS = [
+    "-c:v", "h264_nvenc", "-preset", "p1", "-tune", "ll", "-rc", "cbr", "-multipass", "0",
+    "-b_ref_mode", "0", "-spatial-aq", "0", "-temporal-aq", "0", "-g", "150",
+]
+
+def _combine_methods(video_path, chat_input, output_path, video_info, audio_args, video_seek=()):
+    """Return the ffmpeg combine argv lists to try in order: the GPU pipelines, then CPU last.
+
+    chat_input holds the input options for the chat leg; video_seek is put
+    in front of the VOD input to combine only part of it.
+    """
+    video_input = [*video_seek, "-i", video_path]
+    outputs = ["-map", "[out]", "-map", "0:a?"]
+    tail = [*audio_args, "-r", "30", *SHORTEST_ARGS, output_path]
+
+    # The chat is rendered CHAT_RENDER_HEIGHT high; a VOD at that height is stacked as it is
+    height = CHAT_RENDER_HEIGHT
+    native_height = video_info.get("height") == str(height)
+    if native_height:
+        system_graph = "[0:v][1:v]hstack=inputs=2[out]"
+    else:
+        system_graph = f"[0:v]scale=-2:{height}[v0];[v0][1:v]hstack=inputs=2[out]"
+
+    nvdec_decodable = (
+        video_info.get("codec_name") in NVDEC_CODECS
+        and video_info.get("pix_fmt") in NVDEC_PIX_FMTS
+    )
+    methods = []
+    if nvdec_decodable and not native_height:
+        # Decode and scale the VOD in CUDA memory. There's no hstack_cuda, so the
+        # scaled frames are downloaded once for the software hstack with the chat
+        download_fmt = "p010le" if video_info.get("pix_fmt") in ("yuv420p10le", "p010le") else "nv12"
+        methods.append([
+            FFMPEG, "-y", "-hwaccel", "cuda", "-hwaccel_output_format", "cuda", *video_input, *chat_input,
+            "-filter_complex",
+            f"[0:v]scale_cuda=-2:{height},hwdownload,format={download_fmt}[v0];[v0][1:v]hstack=inputs=2[out]",
+            *outputs, *NVENC_ARGS, "-b:v", "8M", "-maxrate", "8M", "-bufsize", "16M", *tail,
+        ])
+
+    # NVDEC decodes into system memory (or ffmpeg falls back to software decoding),
+    # the stack is filtered there and NVENC encodes
+    bitrate = ["-b:v", "8M", "-maxrate", "8M", "-bufsize", "16M"] if nvdec_decodable else \
+        ["-b:v", "5M", "-maxrate", "5M", "-bufsize", "10M"]
+    methods.append([
+        FFMPEG, "-y", "-hwaccel", "cuda", *video_input, *chat_input,
+        "-filter_complex", system_graph,
+        *outputs, *NVENC_ARGS, *bitrate, *tail,
+    ])
+
+    # CPU fallback as last resort
+    methods.append([
+        FFMPEG, "-y", *video_input, *chat_input,
+        "-filter_complex", system_graph,
+        *outputs, "-c:v", "h264", "-preset", "ultrafast", "-crf", "28", *tail,
+    ])
+    return methods
+
+# VODs at least this long (seconds) are combined in parallel segments of
+# COMBINE_SEGMENT_SECONDS each, using at most MAX_COMBINE_SEGMENTS containers
+SEGMENTED_COMBINE_MIN_DURATION = 3600
+COMBINE_SEGMENT_SECONDS = 1800
+MAX_COMBINE_SEGMENTS = 8
+
+def _segment_times(duration, n):
+    """Split [0, duration) into n contiguous (start, length) ranges; the last length is None (to the end)"""
+    step = duration / n
+    return [(i * step, None if i == n - 1 else step) for i in range(n)]
+
+@app.function(image=image, gpu="L40S", volumes={"/data": volume}, timeout=7200)
+def combine_segment(vod_id, index, start, length=None):
+    """Combine one time range of the VOD and chat into its own part file"""
+    volume.reload()
+    video_path = f"/data/vod_{vod_id}.mp4"
+    chat_path = f"/data/chat_{vod_id}.mp4"
+    part_path = f"/data/combined_{vod_id}_part{index:03d}.mp4"
+
+    video_info = _probe_stream(video_path, "v:0", ["codec_name", "pix_fmt", "height"])
+    seek = ["-ss", f"{start:.3f}"] + (["-t", f"{length:.3f}"] if length else [])
+
+    # Audio is re-encoded so each part starts exactly at its cut; copied packets can overlap the boundary
+    for cmd in _combine_methods(video_path, [*seek, "-i", chat_path], part_path, video_info,
+                                ["-c:a", "aac", "-b:a", "128k"], video_seek=seek):
+        print(f"Segment {index}: {' '.join(cmd)}")
+        result = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL)
+        if result.returncode == 0:
+            _publish()
+            return part_path
+        print(f"Segment {index} method failed with code {result.returncode}: {result.stderr[-2000:]}")
+
+    raise RuntimeError(f"Failed to combine segment {index} of VOD {vod_id}")
+
+def _combine_segmented(vod_id, duration, output_path):
+    """Combine the VOD in parallel segments and concatenate them into output_path.
+
+    Returns False if any segment or the concat fails, so the caller can fall
+    back to a single ffmpeg process.
+    """
+    n = min(MAX_COMBINE_SEGMENTS, math.ceil(duration / COMBINE_SEGMENT_SECONDS))
+    segments = _segment_times(duration, n)
+    part_paths = [f"/data/combined_{vod_id}_part{i:03d}.mp4" for i in range(n)]
+    list_path = f"/data/combined_{vod_id}_parts.txt"
+    print(f"Combining {duration:.0f}s VOD in {n} parallel segments")
+
+    calls = []
+    all_done = False
+    try:
+        for i, (start, length) in enumerate(segments):
+            calls.append(combine_segment.spawn(vod_id, i, start, length))
+        try:
+            for call in calls:
+                call.get()
+            all_done = True
+        except Exception as e:
+            print(f"Segmented combine failed: {e}")
+            # Don't keep the other GPU containers busy on a combine that's being redone
+            for call in calls:
+                try:
+                    call.cancel()
+                except Exception:
+                    pass
+            return False
+
+        # Pick up the parts the segment containers committed
+        volume.reload()
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in part_paths)
+
+        # Every part has the same encoding, so they join without re-encoding
+        result = subprocess.run(
+            [FFMPEG, "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"Segment concat failed with code {result.returncode}: {result.stderr[-2000:]}")
+            return False
+        return True
+    finally:
+        if not all_done:
+            # Wait until every segment call has finished (or been cancelled) so
+            # none commits its part after the cleanup, and see what they committed
+            for call in calls:
+                try:
+                    call.get()
+                except Exception:
+                    pass
+            volume.reload()
+        for path in part_paths + [list_path]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        _publish()  # Drop the parts from the volume, not just this container's view
+
+# Average combined bitrate (bits/s) used to size the preallocated output
+COMBINE_PREALLOC_BITRATE = 6_000_000
+
+def _fallocate(fd, size):
+    """Call fallocate(2) directly, raising OSError if it fails.
+
+    os.posix_fallocate goes through glibc, which quietly writes every block
+    when the filesystem has no fallocate (as the FUSE-backed volume may) -
+    gigabytes of zeros before the encode even starts.
+    """
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    if libc.fallocate(fd, 0, 0, size) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+def _preallocate(path, size):
+    """Create path with size bytes allocated up front; returns False (and leaves no file) if the filesystem can't"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        _fallocate(fd, size)
+        return True
+    except (OSError, AttributeError) as e:
+        if getattr(e, "errno", None) not in (errno.EOPNOTSUPP, errno.ENOSYS):
+            print(f"Could not preallocate {path}: {e}")
+    finally:
+        os.close(fd)
+    os.unlink(path)
+    return False
+
+def _trim_mp4(path):
+    """Truncate a preallocated MP4 to the end of its last top-level box"""
+    end = 0
+    with open(path, "r+b") as f:
+        size = os.fstat(f.fileno()).st_size
+        while end + 8 <= size:
+            f.seek(end)
+            header = f.read(16)
+            box_size = int.from_bytes(header[:4], "big")
+            if box_size == 1:
+                box_size = int.from_bytes(header[8:16], "big")
+            # The zero-filled preallocated tail reads as an empty box
+            if box_size < 8 or header[4:8] == b"\0\0\0\0" or end + box_size > size:
+                break
+            end += box_size
+        if 0 < end < size:
+            f.truncate(end)
+
 @app.function(image=image, gpu="L40S", volumes={"/data": volume}, timeout=7200)
-def combine_videos(vod_id, force=True):
-    """Combine video and chat with GPU acceleration"""
+def combine_videos(vod_id, force=True, fused=False):
+    """Combine video and chat with GPU acceleration
+
+    With fused=True the chat is rendered in this container and streamed as raw
+    frames through a FIFO straight into the combine, skipping the intermediate
+    chat video on the volume. If that fails, the chat is rendered to a file and
+    combined the usual way.
+    """
     print(f"Combining video and chat for VOD {vod_id} with GPU acceleration")
     # Use VOD ID in the filenames for better caching
     video_path = f"/data/vod_{vod_id}.mp4"
     chat_path = f"/data/chat_{vod_id}.mp4"
+    chat_json_path = f"/data/chat_{vod_id}.json"
+    fifo_path = f"/tmp/chat_{vod_id}.nut"
     output_path = f"/data/combined_{vod_id}.mp4"
     
+    # See the files the earlier stages committed, even in a warm container
+    volume.reload()
+    
     # Check if combined video already exists and skip if not forced
     if os.path.exists(output_path) and not force:
         file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
@@ -1218,17 +1596,21 @@ def combine_videos(vod_id, force=True):
         # Check if file size is reasonable (>100MB) to ensure it's a valid video
         if file_size_mb > 100:
             print(f"Using existing combined video. Use force=True to recombine.")
+            _write_manifest(vod_id, "combined", output_path, os.path.getsize(output_path))
+            _publish()
             return output_path
         else:
             print(f"Existing combined video is too small ({file_size_mb:.2f} MB), will recombine")
     
     # Remove existing file to avoid overwrite prompts
-    if os.path.exists(output_path):
-        try:
-            os.remove(output_path)
-            print(f"Removed existing combined video at {output_path}")
-        except Exception as e:
-            print(f"Error removing existing combined video: {e}")
+    try:
+        os.unlink(output_path)
+        print(f"Removed existing combined video at {output_path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error removing existing combined video: {e}")
+    _write_manifest(vod_id, "combined", None)
             
     if force:
         print(f"Force combine requested for video and chat")
@@ -1237,111 +1619,222 @@ def combine_videos(vod_id, force=True):
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video file not found at {video_path}")
     
-    if not os.path.exists(chat_path):
+    if fused and not os.path.exists(chat_json_path):
+        print(f"Chat JSON not found at {chat_json_path}, falling back to the file-based combine")
+        fused = False
+
+    if not fused and not os.path.exists(chat_path):
         raise FileNotFoundError(f"Chat video not found at {chat_path}")
     
-    # Try multiple approaches with better GPU acceleration
-    methods = [
-        # Maximum L40S GPU acceleration with explicit memory management
-        f'ffmpeg -y -hwaccel cuda -hwaccel_output_format cuda -i "{video_path}" -i "{chat_path}" '
-        f'-filter_complex "[0:v]hwupload,format=cuda,scale_cuda=-2:1080[v0];[1:v]hwupload,format=cuda,scale_cuda=-2:1080[v1];[v0][v1]hstack=inputs=2[out]" '
-        f'-map "[out]" -map "0:a?" -c:v h264_nvenc -preset p1 -tune hq -b:v 8M -c:a aac -r 30 -shortest "{output_path}"',
-        
-        # Alternative optimized CUDA approach
-        f'ffmpeg -y -hwaccel cuda -hwaccel_output_format cuda -i "{video_path}" -i "{chat_path}" '
-        f'-filter_complex "[0:v]scale_cuda=-2:1080[v0];[1:v]scale_cuda=-2:1080[v1];[v0][v1]hstack=inputs=2[out]" '
-        f'-map "[out]" -map "0:a?" -c:v h264_nvenc -preset p1 -tune hq -b:v 8M -c:a aac -r 30 -shortest "{output_path}"',
-        
-        # Fallback GPU approach with simpler filters
-        f'ffmpeg -y -hwaccel cuda -i "{video_path}" -i "{chat_path}" '
-        f'-filter_complex "hstack=inputs=2[out]" '
-        f'-map "[out]" -map "0:a?" -c:v h264_nvenc -preset p1 -tune ll -b:v 5M -c:a aac -r 30 -shortest "{output_path}"',
-        
-        # CPU fallback as last resort
-        f'ffmpeg -y -i "{video_path}" -i "{chat_path}" '
-        f'-filter_complex "hstack=inputs=2[out]" '
-        f'-map "[out]" -map "0:a?" -c:v h264 -preset ultrafast -crf 28 -c:a aac -r 30 -shortest "{output_path}"'
-    ]
-    
-    for i, cmd in enumerate(methods):
+    # Probe the VOD's video stream once so we launch the one GPU pipeline that
+    # can work for it, instead of failing through several ffmpeg cold starts
+    video_info = _probe_stream(video_path, "v:0", ["codec_name", "pix_fmt", "height"])
+    print(f"VOD video stream: {video_info or 'probe failed'}")
+
+    # Twitch audio is already AAC, so stream-copy it unless the probe says otherwise
+    audio_codec = _probe_stream(video_path, "a:0", ["codec_name"]).get("codec_name")
+    if audio_codec in (None, "aac"):
+        audio_args = ["-c:a", "copy"]
+    else:
+        print(f"VOD audio is {audio_codec}, re-encoding to AAC")
+        audio_args = ["-c:a", "aac", "-b:a", "128k"]
+
+    def build_methods(chat_input):
+        return _combine_methods(video_path, chat_input, output_path, video_info, audio_args)
+
+    # Long VODs are split across several GPU containers and concatenated
+    duration = _probe_duration(video_path)
+    if not fused and duration and duration >= SEGMENTED_COMBINE_MIN_DURATION and _combine_segmented(vod_id, duration, output_path):
+        print(f"Videos combined to {output_path} from parallel segments")
+        _write_manifest(vod_id, "combined", output_path, os.path.getsize(output_path))
+        _publish()
+        return output_path
+
+    # (command, streams the chat render through the FIFO)
+    methods = [(cmd, False) for cmd in build_methods(["-i", chat_path])]
+    if fused:
+        # Each fused attempt streams a fresh render; the GPU pipelines are tried
+        # fused, and the CPU encode only runs from a rendered file
+        methods[:0] = [(cmd, True) for cmd in build_methods(["-f", "nut", "-i", fifo_path])[:-1]]
+
+        try:
+            version_str, _ = _probe_downloader(DOWNLOADER_PATH)
+        except Exception as e:
+            print(f"Error checking TwitchDownloaderCLI capabilities: {e}")
+            version_str = "unknown"
+        vod_duration = duration
+
+    # Size the output up front so the write path doesn't allocate block by block
+    expected_size = int(duration * COMBINE_PREALLOC_BITRATE / 8) if duration else 0
+
+    for i, (cmd, fused_method) in enumerate(methods):
+        chat_proc = None
         try:
             print(f"Trying method {i+1}/{len(methods)}...")
-            print(f"Running command: {cmd}")
+
+            if fused_method:
+                # Render the chat into a FIFO that ffmpeg reads as its second input
+                try:
+                    os.unlink(fifo_path)
+                except FileNotFoundError:
+                    pass
+                os.mkfifo(fifo_path)
+                chat_cmd = _chatrender_cmd(DOWNLOADER_PATH, chat_json_path, fifo_path, vod_duration,
+                                           version_str, output_args=FUSED_CHAT_OUTPUT_ARGS)
+                print(f"Running fused chat render: {' '.join(chat_cmd)}")
+                chat_log = open(f"/tmp/chatrender_{vod_id}.log", "wb")
+                chat_proc = subprocess.Popen(chat_cmd, stdout=chat_log, stderr=subprocess.STDOUT)
+                chat_log.close()
+            elif not os.path.exists(chat_path):
+                # The fused attempt didn't leave a chat video behind; render one for the file-based methods
+                print("Rendering chat to a file for the file-based combine...")
+                render_chat.remote(vod_id, force=True)
+                volume.reload()
+
+            # Have ffmpeg write into the preallocated file instead of truncating it
+            preallocated = expected_size > 0 and _preallocate(output_path, expected_size)
+            if preallocated:
+                cmd = [*cmd[:-1], "-truncate", "0", cmd[-1]]
+
+            print(f"Running command: {' '.join(cmd)}")
             
             # Start the process with real-time monitoring
             process = subprocess.Popen(
                 cmd,
-                shell=True,
+                stdin=subprocess.DEVNULL,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                universal_newlines=True
+                bufsize=0
             )
             
             # Track start time and set up monitoring variables
-            start_time = time.time()
+            start_time = time.monotonic()
             last_progress_time = start_time
-            last_file_size = 0 if os.path.exists(output_path) else 0
+            last_file_size = 0
             combine_timeout = 3600  # 1 hour max for combining videos
+
+            # Watch both pipes with one selector; its timeout is the loop's sleep.
+            # Recent stderr is kept for the failure message.
+            sel = selectors.DefaultSelector()
+            for pipe in (process.stdout, process.stderr):
+                os.set_blocking(pipe.fileno(), False)
+                sel.register(pipe.fileno(), selectors.EVENT_READ)
+            pending = {process.stdout.fileno(): bytearray(), process.stderr.fileno(): bytearray()}
+            err_fd = process.stderr.fileno()
+            stderr_tail = deque(maxlen=50)
+            fifo_released = False
+            encoded = 0.0  # Seconds of output ffmpeg last reported
+            render_exit_at = None  # What had been encoded when the render was seen to exit
             
             # Monitor the process
-            while process.poll() is None:
-                current_time = time.time()
-                elapsed = current_time - start_time
-                
-                # Check for timeout
-                if elapsed > combine_timeout:
-                    print(f"⚠️ Video combining timed out after {combine_timeout} seconds. Terminating process.")
-                    process.terminate()
-                    time.sleep(1)
-                    if process.poll() is None:
-                        process.kill()
-                    break
-                
-                # Process output
-                stderr_ready = select.select([process.stderr], [], [], 0.1)[0]
-                if stderr_ready:
-                    line = process.stderr.readline()
-                    if line and "frame=" in line:  # ffmpeg progress
-                        print(f"PROGRESS: {line.strip()}")
-                
-                # Print periodic status updates about the combining progress
-                if current_time - last_progress_time > 10:  # Every 10 seconds
-                    print(f"Video combining in progress, elapsed time: {int(elapsed)}s")
+            try:
+                while process.poll() is None:
+                    current_time = time.monotonic()
+                    elapsed = current_time - start_time
                     
-                    # Check output file growth
-                    if os.path.exists(output_path):
-                        current_file_size = os.path.getsize(output_path)
-                        file_size_mb = current_file_size / (1024 * 1024)
-                        
-                        # Calculate growth rate
-                        size_diff_mb = (current_file_size - last_file_size) / (1024 * 1024)
-                        time_diff = current_time - last_progress_time
-                        processing_speed = size_diff_mb / time_diff if time_diff > 0 else 0
+                    # Check for timeout
+                    if elapsed > combine_timeout:
+                        print(f"⚠️ Video combining timed out after {combine_timeout} seconds. Terminating process.")
+                        _stop_process(process)
+                        break
+
+                    # A render that dies before opening the FIFO would leave ffmpeg
+                    # waiting on it forever, so hand ffmpeg an EOF once it has it open
+                    if chat_proc is not None and render_exit_at is None and chat_proc.poll() is not None:
+                        render_exit_at = encoded
+                    if render_exit_at is not None and not fifo_released:
+                        try:
+                            os.close(os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+                            fifo_released = True
+                        except OSError:
+                            pass  # ffmpeg hasn't opened it yet
+                    
+                    # Process output
+                    for key, _ in sel.select(timeout=1.0):
+                        try:
+                            lines, eof = _read_pipe_lines(key.fd, pending[key.fd])
+                        except BlockingIOError:
+                            continue
+                        if eof:
+                            sel.unregister(key.fd)
+                        if key.fd != err_fd:
+                            continue
+                        for line in lines:
+                            stderr_tail.append(line)
+                            if "frame=" in line:  # ffmpeg progress
+                                print(f"PROGRESS: {line.strip()}")
+                                m = _STATS_TIME_RE.search(line)
+                                if m:
+                                    hours, minutes, seconds = m.groups()
+                                    encoded = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                    
+                    # Print periodic status updates about the combining progress
+                    if current_time - last_progress_time > 10:  # Every 10 seconds
+                        print(f"Video combining in progress, elapsed time: {int(elapsed)}s")
                         
-                        print(f"Combine progress: output size {file_size_mb:.2f} MB (Speed: {processing_speed:.2f} MB/s)")
+                        # Check output file growth with a single stat
+                        try:
+                            current_file_size = os.stat(output_path).st_size
+                            file_size_mb = current_file_size / (1024 * 1024)
+                            
+                            # Calculate growth rate
+                            size_diff_mb = (current_file_size - last_file_size) / (1024 * 1024)
+                            time_diff = current_time - last_progress_time
+                            processing_speed = size_diff_mb / time_diff if time_diff > 0 else 0
+                            
+                            print(f"Combine progress: output size {file_size_mb:.2f} MB (Speed: {processing_speed:.2f} MB/s)")
+                            
+                            # Update for next iteration
+                            last_file_size = current_file_size
+                        except FileNotFoundError:
+                            print(f"Output file not created yet")
                         
-                        # Update for next iteration
-                        last_file_size = current_file_size
-                    else:
-                        print(f"Output file not created yet")
-                    
-                    last_progress_time = current_time
-                
-                # Brief sleep to prevent CPU spinning
-                time.sleep(0.1)
+                        last_progress_time = current_time
+            finally:
+                sel.close()
             
             # Process completed, get return code
-            return_code = process.poll()
-            
+            return_code = process.wait()
+
+            # With +shortest the combine stops reading before the render is done,
+            # which then fails on the closed FIFO; that's only fine at the very end
+            if (return_code == 0 and render_exit_at is not None and chat_proc.returncode != 0
+                    and vod_duration and render_exit_at < vod_duration - FUSED_RENDER_EXIT_SLACK):
+                print(f"Fused chat render failed with code {chat_proc.returncode} after "
+                      f"{render_exit_at:.0f}s of {vod_duration:.0f}s were combined; the chat would freeze")
+                return_code = chat_proc.returncode
+
             if return_code == 0:
+                if preallocated:
+                    _trim_mp4(output_path)
                 print(f"Videos combined to {output_path} using method {i+1}")
+                _write_manifest(vod_id, "combined", output_path, os.path.getsize(output_path))
+                _publish()
                 return output_path
             else:
-                stderr = process.stderr.read()
+                stderr = ''.join(stderr_tail) + pending[err_fd].decode(errors='replace')
                 print(f"Method {i+1} failed with code {return_code}: {stderr}")
+                if chat_proc is not None:
+                    with open(f"/tmp/chatrender_{vod_id}.log", "rb") as f:
+                        print(f"Fused chat render log tail: {f.read()[-4096:].decode(errors='replace')}")
                 
         except Exception as e:
             print(f"Method {i+1} failed with exception: {e}")
+        finally:
+            if chat_proc is not None:
+                if chat_proc.poll() is None:
+                    _stop_process(chat_proc)
+                chat_proc.wait()
+                try:
+                    os.unlink(fifo_path)
+                except FileNotFoundError:
+                    pass
+
+        # Don't leave a failed attempt's output behind; preallocated, it's full size
+        try:
+            os.unlink(output_path)
+        except FileNotFoundError:
+            pass
     
     raise RuntimeError("All video combining methods failed")
 
@@ -1351,8 +1844,14 @@ def get_result(vod_id):
     src_path = f"/data/combined_{vod_id}.mp4"
     dest_path = f"vod_{vod_id}.mp4"
     
-    # Check if the source file exists
-    if not os.path.exists(src_path):
+    # See the combined video committed by combine_videos, even in a warm container
+    volume.reload()
+    
+    # The manifest records where combine_videos wrote its output
+    combined = _read_manifest(vod_id).get("combined")
+    if combined and os.path.exists(combined["path"]):
+        src_path = combined["path"]
+    elif not os.path.exists(src_path):
         print(f"Combined video not found at {src_path}, checking alternative paths...")
         # Try some alternative paths
         alt_paths = [
@@ -1374,10 +1873,9 @@ def get_result(vod_id):
     file_size_mb = os.path.getsize(src_path) / (1024 * 1024)
     print(f"Source file: {src_path} (Size: {file_size_mb:.2f} MB)")
     
-    # Copy from volume to container
-    import shutil
-    print(f"Copying from {src_path} to {dest_path}")
-    shutil.copy(src_path, dest_path)
+    # Link (or copy) from volume to container
+    print(f"Linking or copying from {src_path} to {dest_path}")
+    link_or_copy(src_path, dest_path)
     
     # Verify the copy worked
     if os.path.exists(dest_path):
@@ -1389,16 +1887,21 @@ def get_result(vod_id):
     # Modal will automatically download this file
     return dest_path
 
-@app.function(timeout=7200)
-def process_vod(vod_id, force=True):
-    """Process a VOD from start to finish"""
+@app.function(volumes={"/data": volume}, timeout=7200)
+def process_vod(vod_id, force=True, fused=False):
+    """Process a VOD from start to finish
+
+    fused=True streams the chat render straight into the combine step instead
+    of writing the chat video to the volume first.
+    """
     print(f"Processing VOD {vod_id} with GPU acceleration")
     combined_output_path = f"/data/combined_{vod_id}.mp4"
     
-    # Check if combined file already exists and skip processing if not forced
-    if os.path.exists(combined_output_path) and not force:
-        file_size_mb = os.path.getsize(combined_output_path) / (1024 * 1024)
-        print(f"Combined video already exists at {combined_output_path} ({file_size_mb:.2f} MB)")
+    # Check the manifest for an earlier combined video and skip processing if not forced
+    combined = _read_manifest(vod_id).get("combined")
+    if combined and not force:
+        file_size_mb = combined["size"] / (1024 * 1024)
+        print(f"Combined video already exists at {combined['path']} ({file_size_mb:.2f} MB)")
         
         if file_size_mb > 100:
             print(f"Using existing combined video. Use force=True to reprocess.")
@@ -1411,29 +1914,31 @@ def process_vod(vod_id, force=True):
     elif force:
         print(f"Force processing requested for VOD {vod_id}")
     
-    # Step 1: Setup TwitchDownloaderCLI
-    print("Setting up TwitchDownloaderCLI...")
-    downloader_path = download_downloader.remote()
-    print(f"Downloader setup complete: {downloader_path}")
+    # Step 1: TwitchDownloaderCLI is baked into the image, no setup call needed
+    print(f"Using TwitchDownloaderCLI from image: {DOWNLOADER_PATH}")
     
-    # Step 2: Download VOD and chat sequentially to avoid race conditions
-    print("Downloading VOD...")
-    vod_path = download_vod.remote(vod_id, force=False)
-    print(f"VOD download complete: {vod_path}")
+    # Step 2: Download VOD and chat in parallel; they write to different files
+    print("Downloading VOD and chat...")
+    vod_future = download_vod.spawn(vod_id, force=False)
+    chat_future = download_chat.spawn(vod_id, force=False)
     
-    print("Downloading chat...")
-    chat_path = download_chat.remote(vod_id, force=False)
+    vod_path = vod_future.get()
+    print(f"VOD download complete: {vod_path}")
+    chat_path = chat_future.get()
     print(f"Chat download complete: {chat_path}")
     
     # Check if chat video already exists
-    chat_mp4_path = f"/data/chat_{vod_id}.mp4"
-    if os.path.exists(chat_mp4_path) and not force:
-        file_size_mb = os.path.getsize(chat_mp4_path) / (1024 * 1024)
-        print(f"Chat video already exists at {chat_mp4_path} ({file_size_mb:.2f} MB)")
+    chat_video = _read_manifest(vod_id).get("chat_video")
+    if fused:
+        # Step 3 happens inside the combine, rendering straight into ffmpeg
+        print("Fused mode: chat will be rendered during the combine step")
+    elif chat_video and not force:
+        file_size_mb = chat_video["size"] / (1024 * 1024)
+        print(f"Chat video already exists at {chat_video['path']} ({file_size_mb:.2f} MB)")
         
         if file_size_mb > 5:  # At least 5MB for a valid chat video
             print(f"Using existing chat video. Use force=True to re-render.")
-            chat_mp4 = chat_mp4_path
+            chat_mp4 = chat_video["path"]
         else:
             print(f"Existing chat video is too small ({file_size_mb:.2f} MB), will re-render")
             print("Rendering chat with GPU...")
@@ -1442,40 +1947,33 @@ def process_vod(vod_id, force=True):
     else:
         # Step 3: Render chat with GPU
         print("Rendering chat with GPU...")
-        # Wait for 10 seconds to ensure the chat file is ready
-        print("Waiting for chat file to be ready...")
-        time.sleep(10)
-        print("Rendering chat...")
         chat_mp4 = render_chat.remote(vod_id, force=force)
         print(f"Chat rendering complete: {chat_mp4}")
     
     # Step 4: Combine video and chat
     print("Combining video and chat...")
-    # Wait for 10 seconds to ensure the chat video is ready
-    print("Waiting for chat video to be ready...")
-    time.sleep(10)
-    print("Combining videos...")
-    result_path = combine_videos.remote(vod_id, force=force)
+    result_path = combine_videos.remote(vod_id, force=force, fused=fused)
     print(f"Video combining complete: {result_path}")
     
     # Step 5: Get the result and prepare for download
     print("Getting final result...")
     print(f"Preparing file for download - combined video path: {combined_output_path}")
     
-    # Ensure the combined file exists
-    if os.path.exists(combined_output_path):
-        file_size_mb = os.path.getsize(combined_output_path) / (1024 * 1024)
-        print(f"Combined video exists: {combined_output_path} (Size: {file_size_mb:.2f} MB)")
+    # Ensure the combined file exists; pick up what the other containers wrote first
+    volume.reload()
+    combined = _read_manifest(vod_id).get("combined")
+    if combined:
+        file_size_mb = combined["size"] / (1024 * 1024)
+        print(f"Combined video exists: {combined['path']} (Size: {file_size_mb:.2f} MB)")
     else:
         print(f"Warning: Combined video not found at expected path: {combined_output_path}")
         print("Looking for any video outputs...")
         # Try to find any video files that might have been created
-        potential_videos = []
-        for file in os.listdir("/data"):
-            if file.endswith(".mp4"):
-                file_path = f"/data/{file}"
-                file_size = os.path.getsize(file_path) / (1024 * 1024)
-                potential_videos.append((file_path, file_size))
+        with os.scandir("/data") as entries:
+            potential_videos = [
+                (entry.path, entry.stat().st_size / (1024 * 1024))
+                for entry in entries if entry.name.endswith(".mp4")
+            ]
         
         if potential_videos:
             # Sort by size, largest first
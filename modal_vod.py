@@ -13,7 +13,8 @@ import os
 import sys
 import subprocess
 import time
-import json
+import shutil
+from modal_common import NVENC_COMBINE_ARGS, NVENC_OUTPUT_ARGS, link_or_copy, video_height
 
 # Define app
 app = modal.App("twitch-vod-processor")
@@ -32,68 +33,18 @@ image = (
         "ca-certificates",
     )
     .pip_install("twitch-dl")
+    .run_commands(
+        # Bake TwitchDownloaderCLI into the image layer so workers don't fetch it at runtime
+        "curl -L -o /tmp/td.zip "
+        "https://github.com/lay295/TwitchDownloader/releases/download/1.55.5/TwitchDownloaderCLI-1.55.5-Linux-x64.zip && "
+        "unzip -o /tmp/td.zip -d /usr/local/bin && "
+        "chmod +x /usr/local/bin/TwitchDownloaderCLI && rm /tmp/td.zip"
+    )
+    .add_local_python_source("modal_common")
 )
 
-# For persisting configuration between functions
-@app.function(image=image, volumes={"/data": volume})
-def save_config(config):
-    """Save configuration to volume"""
-    print(f"Saving configuration: {config}")
-    with open("/data/config.json", "w") as f:
-        json.dump(config, f)
-    return "/data/config.json"
-
-@app.function(image=image, volumes={"/data": volume})
-def get_config():
-    """Get configuration from volume"""
-    try:
-        with open("/data/config.json", "r") as f:
-            config = json.load(f)
-        print(f"Loaded configuration: {config}")
-        return config
-    except FileNotFoundError:
-        print("No configuration found")
-        return {}
-
-@app.function(image=image, volumes={"/data": volume})
-def download_downloader():
-    """Download and setup TwitchDownloaderCLI"""
-    import os
-    import subprocess
-    
-    # Create directory if it doesn't exist
-    os.makedirs("/data/bin", exist_ok=True)
-    
-    # Latest release URL
-    url = "https://github.com/lay295/TwitchDownloader/releases/download/1.55.5/TwitchDownloaderCLI-1.55.5-Linux-x64.zip"
-    
-    # Download and extract
-    print(f"Downloading TwitchDownloaderCLI from {url}")
-    
-    try:
-        # Download with curl to avoid wget issues
-        subprocess.run(
-            ["curl", "-L", "-o", "/data/twitch-dl.zip", url],
-            check=True
-        )
-        
-        # Unzip to bin directory
-        subprocess.run(
-            ["unzip", "-o", "/data/twitch-dl.zip", "-d", "/data/bin"],
-            check=True
-        )
-        
-        # Make executable
-        subprocess.run(
-            ["chmod", "+x", "/data/bin/TwitchDownloaderCLI"],
-            check=True
-        )
-        
-        print("TwitchDownloaderCLI setup completed")
-        return "/data/bin/TwitchDownloaderCLI"
-    except Exception as e:
-        print(f"Error setting up TwitchDownloaderCLI: {e}")
-        raise
+# TwitchDownloaderCLI is baked into the image at build time
+DOWNLOADER_PATH = "/usr/local/bin/TwitchDownloaderCLI"
 
 @app.function(image=image, volumes={"/data": volume})
 def download_vod(vod_id):
@@ -113,16 +64,11 @@ def download_vod(vod_id):
     return output_path
 
 @app.function(image=image, volumes={"/data": volume})
-def download_chat(vod_id, downloader_path="/data/bin/TwitchDownloaderCLI"):
+def download_chat(vod_id, downloader_path):
     """Download Twitch chat"""
     print(f"Downloading chat for VOD: {vod_id}")
     output_path = "/data/chat.json"
     
-    # First make sure TwitchDownloaderCLI is available
-    if not os.path.exists(downloader_path):
-        print(f"TwitchDownloaderCLI not found at {downloader_path}, setting up...")
-        downloader_path = download_downloader.remote()
-    
     # Download chat
     subprocess.run([
         downloader_path, "chatdownload",
@@ -134,20 +80,15 @@ def download_chat(vod_id, downloader_path="/data/bin/TwitchDownloaderCLI"):
     print(f"Chat downloaded to {output_path}")
     return output_path
 
-@app.function(image=image, gpu="T4", volumes={"/data": volume})
-def render_chat(downloader_path="/data/bin/TwitchDownloaderCLI"):
-    """Render chat JSON to MP4"""
-    print("Rendering chat to video with GPU acceleration")
-    chat_json_path = "/data/chat.json"
-    output_path = "/data/chat.mp4"
-    
-    # First make sure TwitchDownloaderCLI is available
-    if not os.path.exists(downloader_path):
-        print(f"TwitchDownloaderCLI not found at {downloader_path}, setting up...")
-        downloader_path = download_downloader.remote()
-    
-    # Render chat to video
-    subprocess.run([
+# ffmpeg output arguments for streaming raw chat frames into a FIFO
+FIFO_OUTPUT_ARGS = '-c:v rawvideo -pix_fmt yuv420p -f nut -y "{save_path}"'
+
+# Seconds the combine may keep running after the renderer fails for that to be
+# the EPIPE of a combine that had stopped reading and was only finishing up
+FIFO_RENDER_EXIT_GRACE = 10
+
+def _chatrender_cmd(downloader_path, chat_json_path, output_path):
+    return [
         downloader_path, "chatrender",
         "-i", chat_json_path,
         "-h", "1080",
@@ -155,69 +96,161 @@ def render_chat(downloader_path="/data/bin/TwitchDownloaderCLI"):
         "--framerate", "30",
         "--font-size", "18",
         "-o", output_path
-    ], check=True)
+    ]
+
+def _render_chat(downloader_path, chat_json_path, output_path):
+    """Render chat JSON to an MP4 at output_path"""
+    # Render chat to video
+    cmd = _chatrender_cmd(downloader_path, chat_json_path, output_path)
+    
+    try:
+        # Encode on the T4's NVENC instead of libx264 on the CPU
+        subprocess.run(cmd + ["--output-args", NVENC_OUTPUT_ARGS], check=True)
+    except subprocess.CalledProcessError:
+        # If the hardware encoder isn't usable, fall back to the default encoder
+        print("NVENC chat render failed, retrying with the default encoder...")
+        subprocess.run(cmd, check=True)
     
     print(f"Chat rendered to {output_path}")
+
+@app.function(image=image, gpu="T4", volumes={"/data": volume})
+def render_chat(downloader_path):
+    """Render chat JSON to MP4"""
+    print("Rendering chat to video with GPU acceleration")
+    output_path = "/data/chat.mp4"
+    _render_chat(downloader_path, "/data/chat.json", output_path)
     return output_path
 
+def _gpu_combine_cmd(video_path, chat_input, output_path, native_1080):
+    """Build the GPU ffmpeg argv; chat_input holds the input options for the chat"""
+    if native_1080:
+        # Decode on the GPU and stack the frames as they are
+        gpu_input, vod_leg = ["-hwaccel", "cuda"], "[0:v]"
+    else:
+        # Decode and scale the VOD on the GPU; frames only leave VRAM once, already
+        # scaled, to be stacked with the chat (which is decoded on the CPU anyway)
+        gpu_input = ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        vod_leg = "[0:v]scale_cuda=-2:1080:format=yuv420p,hwdownload,format=yuv420p[v0];[v0]"
+    return [
+        "ffmpeg", "-y", *gpu_input, "-i", video_path, *chat_input,
+        "-filter_complex", f"{vod_leg}[1:v]xstack=inputs=2:layout=0_0|w0_0[out]",
+        "-map", "[out]", "-map", "0:a?", *NVENC_COMBINE_ARGS, "-c:a", "aac", "-r", "30", "-shortest", output_path,
+    ]
+
+def _combine(video_path, chat_path, output_path):
+    """Stack the VOD and chat side by side into output_path"""
+    # The chat is rendered at 1080 high; when the VOD is too, nothing needs scaling
+    native_1080 = video_height(video_path) == 1080
+    cmd = _gpu_combine_cmd(video_path, ["-i", chat_path], output_path, native_1080)
+    
+    try:
+        subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
+    except subprocess.CalledProcessError:
+        # If CUDA can't be initialised, fall back to the CPU
+        print("GPU processing failed, falling back to CPU...")
+        vod_leg = "[0:v]" if native_1080 else "[0:v]scale=-2:1080:flags=lanczos[v0];[v0]"
+        cmd = [
+            "ffmpeg", "-y", "-filter_threads", str(os.cpu_count() or 1), "-i", video_path, "-i", chat_path,
+            "-filter_complex", f"{vod_leg}[1:v]xstack=inputs=2:layout=0_0|w0_0[out]",
+            "-map", "[out]", "-map", "0:a?", "-c:v", "h264", "-preset", "veryfast", "-crf", "23", "-threads", "0",
+            "-x264-params", "threads=0:sliced-threads=1", "-c:a", "aac", "-r", "30", "-shortest", output_path,
+        ]
+        subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
+    
+    print(f"Videos combined to {output_path}")
+
 @app.function(image=image, gpu="T4", volumes={"/data": volume})
 def combine_videos():
     """Combine video and chat with GPU acceleration"""
     print("Combining video and chat with GPU acceleration")
+    output_path = "/data/chat_with_video.mp4"
+    _combine("/data/forsen2.mp4", "/data/chat.mp4", output_path)
+    return output_path
+
+@app.function(image=image, gpu="T4", volumes={"/data": volume})
+def render_and_combine(downloader_path):
+    """Render chat and combine it with the VOD in one container.
+
+    The renderer streams raw frames through a FIFO straight into the combine,
+    so no chat video is written at all. If that fails, the chat is rendered
+    to the container's local disk and combined from there.
+    """
+    print("Rendering chat and combining with GPU acceleration")
+    chat_json_path = "/data/chat.json"
     video_path = "/data/forsen2.mp4"
-    chat_path = "/data/chat.mp4"
+    fifo_path = "/tmp/chat.fifo"
     output_path = "/data/chat_with_video.mp4"
     
-    # Try CPU-based processing first
-    cmd = (
-        f'ffmpeg -i "{video_path}" -i "{chat_path}" '
-        f'-filter_complex "[0:v]scale=-2:1080:flags=lanczos[v0];[1:v]scale=-2:1080:flags=lanczos[v1];[v0][v1]hstack=inputs=2[out]" '
-        f'-map "[out]" -map "0:a?" -c:v h264 -c:a aac -r 30 -shortest "{output_path}"'
+    if os.path.exists(fifo_path):
+        os.remove(fifo_path)
+    os.mkfifo(fifo_path)
+    
+    render = subprocess.Popen(
+        _chatrender_cmd(downloader_path, chat_json_path, fifo_path) + ["--output-args", FIFO_OUTPUT_ARGS]
+    )
+    combine = subprocess.Popen(
+        _gpu_combine_cmd(video_path, ["-f", "nut", "-i", fifo_path], output_path, video_height(video_path) == 1080),
+        stdin=subprocess.DEVNULL
     )
     
-    try:
-        subprocess.run(cmd, shell=True, check=True)
-    except subprocess.CalledProcessError:
-        # If CPU approach fails, try with GPU
-        print("CPU-based processing failed, trying with GPU acceleration...")
-        cmd = (
-            f'ffmpeg -hwaccel cuda -i "{video_path}" -i "{chat_path}" '
-            f'-filter_complex "[0:v]scale=-2:1080:flags=lanczos[v0];[1:v]scale=-2:1080:flags=lanczos[v1];[v0][v1]hstack=inputs=2[out]" '
-            f'-map "[out]" -map "0:a?" -c:v h264_nvenc -c:a aac -r 30 -shortest "{output_path}"'
-        )
-        subprocess.run(cmd, shell=True, check=True)
+    # Note when the renderer exits. If it dies before opening the FIFO, ffmpeg
+    # would wait on it forever, so open and close the write end once to hand
+    # the combine an EOF instead
+    render_exited = None
+    released = False
+    while combine.poll() is None:
+        if render_exited is None and render.poll() is not None:
+            render_exited = time.monotonic()
+        if render_exited is not None and not released:
+            try:
+                os.close(os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+                released = True
+            except OSError:
+                pass  # The combine hasn't opened it yet; try again next time round
+        time.sleep(1)
+    combine_code = combine.wait()
+    combine_exited = time.monotonic()
+    if render.poll() is None:
+        render.kill()
+    render_code = render.wait()
+    os.remove(fifo_path)
     
-    print(f"Videos combined to {output_path}")
+    # With -shortest the combine stops reading before the renderer is done, and
+    # the renderer then fails on the closed FIFO just before the combine exits.
+    # Failing any earlier, it died mid-stream and xstack froze the chat on its
+    # last frame for the rest of the output
+    died_mid_stream = (render_code != 0 and render_exited is not None
+                       and combine_exited - render_exited > FIFO_RENDER_EXIT_GRACE)
+    if combine_code == 0 and not died_mid_stream:
+        print(f"Videos combined to {output_path}")
+        return output_path
+    
+    print(f"Streamed render failed (render: {render_code}, combine: {combine_code}), rendering to local disk...")
+    chat_path = "/tmp/chat.mp4"
+    _render_chat(downloader_path, chat_json_path, chat_path)
+    _combine(video_path, chat_path, output_path)
+    os.remove(chat_path)
     return output_path
 
 @app.function(image=image, volumes={"/data": volume})
 def get_result():
     """Return the combined video file"""
-    import shutil
-    
     src_path = "/data/chat_with_video.mp4"
     dest_path = "result.mp4"
     
-    # Copy the file from volume to container
-    shutil.copy(src_path, dest_path)
+    # Link (or copy) the file from volume to container
+    link_or_copy(src_path, dest_path)
     
     # Modal will automatically download this file
     return dest_path
 
 @app.function()
-def process_complete_job():
+def process_complete_job(vod_id):
     """Process a complete VOD job"""
-    # Get configuration with VOD ID
-    config = get_config.remote()
-    
-    if "vod_id" not in config:
-        raise ValueError("No VOD ID found in configuration. Run setup_job first.")
-    
-    vod_id = config["vod_id"]
     print(f"Processing VOD {vod_id}")
     
-    # Step 1: Setup downloader
-    downloader_path = download_downloader.remote()
+    # Step 1: TwitchDownloaderCLI is already in the image
+    downloader_path = DOWNLOADER_PATH
     
     # Step 2: Download VOD and chat in parallel
     vod_future = download_vod.spawn(vod_id)
@@ -226,11 +259,8 @@ def process_complete_job():
     vod_path = vod_future.get()
     chat_path = chat_future.get()
     
-    # Step 3: Render chat
-    render_chat.remote(downloader_path)
-    
-    # Step 4: Combine videos
-    combine_videos.remote()
+    # Step 3-4: Render chat and combine videos in one container
+    render_and_combine.remote(downloader_path)
     
     # Step 5: Get result
     result_path = get_result.remote()
@@ -251,14 +281,10 @@ def run_locally():
     start_time = time.time()
     
     try:
-        # Save VOD ID to configuration
-        save_config.remote({"vod_id": vod_id})
-        
         # Process the job
-        result_path = process_complete_job.remote()
+        result_path = process_complete_job.remote(vod_id)
         
         # Save locally
-        import shutil
         shutil.copy(result_path, "chat_with_video.mp4")
         
         # Calculate elapsed time
@@ -14,8 +14,8 @@ import sys
 import subprocess
 import time
 import modal
-import shutil
 from pathlib import Path
+from modal_common import NVENC_COMBINE_ARGS, NVENC_OUTPUT_ARGS, copy_file, video_height
 
 # Constants
 VIDEO_FILE = "forsen2.mp4"
@@ -54,6 +54,10 @@ gpu_image = base_image.pip_install(
     "chmod +x /usr/local/bin/TwitchDownloaderCLI"
 )
 
+# Ship the shared helpers with both images; adding local files is their last step
+gpu_image = gpu_image.add_local_python_source("modal_common")
+base_image = base_image.add_local_python_source("modal_common")
+
 @app.function(image=gpu_image, volumes={"/data": volume}, timeout=3600)
 def download_vod(vod_id, output_file=VIDEO_FILE):
     """Download the Twitch VOD"""
@@ -63,8 +67,8 @@ def download_vod(vod_id, output_file=VIDEO_FILE):
     output_path = f"/data/{output_file}"
     
     # Use twitch-dl to download the VOD
-    cmd = f'twitch-dl download -q 1080p60 {vod_id} -o "{output_path}" --chapter 1'
-    subprocess.run(cmd, shell=True, check=True)
+    cmd = ["twitch-dl", "download", "-q", "1080p60", vod_id, "-o", output_path, "--chapter", "1"]
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
     
     print(f"[✓] VOD downloaded to {output_path}")
     return output_path
@@ -78,8 +82,8 @@ def download_chat(vod_id, output_json=CHAT_JSON):
     output_path = f"/data/{output_json}"
     
     # Use TwitchDownloaderCLI to download chat
-    cmd = f'/usr/local/bin/TwitchDownloaderCLI chatdownload --id {vod_id} -o "{output_path}" -E'
-    subprocess.run(cmd, shell=True, check=True)
+    cmd = ["/usr/local/bin/TwitchDownloaderCLI", "chatdownload", "--id", vod_id, "-o", output_path, "-E"]
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
     
     print(f"[✓] Chat data downloaded to {output_path}")
     return output_path
@@ -92,9 +96,17 @@ def render_chat(chat_json_path, output_file=CHAT_FILE):
     # Make sure we're writing to the volume
     output_path = f"/data/{output_file}"
     
-    # Use TwitchDownloaderCLI to render chat with hardware acceleration
-    cmd = f'/usr/local/bin/TwitchDownloaderCLI chatrender -i "{chat_json_path}" -h 1080 -w 422 --framerate 30 --font-size 18 -o "{output_path}"'
-    subprocess.run(cmd, shell=True, check=True)
+    # Use TwitchDownloaderCLI to render chat, encoding on the GPU with NVENC
+    cmd = [
+        "/usr/local/bin/TwitchDownloaderCLI", "chatrender", "-i", chat_json_path,
+        "-h", "1080", "-w", "422", "--framerate", "30", "--font-size", "18", "-o", output_path
+    ]
+    try:
+        subprocess.run(cmd + ["--output-args", NVENC_OUTPUT_ARGS], check=True, stdin=subprocess.DEVNULL)
+    except subprocess.CalledProcessError:
+        # If the hardware encoder isn't usable, fall back to the default encoder
+        print("[!] NVENC chat render failed, retrying with the default encoder")
+        subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
     
     print(f"[✓] Chat rendered to {output_path}")
     return output_path
@@ -107,13 +119,20 @@ def combine_video_and_chat(video_path, chat_path, output_file=OUTPUT_FILE):
     # Make sure we're writing to the volume
     output_path = f"/data/{output_file}"
     
-    # Use FFmpeg with hardware acceleration to combine the files
-    cmd = (
-        f'ffmpeg -hwaccel cuda -i "{video_path}" -i "{chat_path}" '
-        f'-filter_complex "[0:v]scale=-2:1080:flags=lanczos[v0];[1:v]scale=-2:1080:flags=lanczos[v1];[v0][v1]hstack=inputs=2[out]" '
-        f'-map "[out]" -map "0:a?" -c:v h264_nvenc -c:a aac -r 30 -shortest "{output_path}"'
-    )
-    subprocess.run(cmd, shell=True, check=True)
+    # Use FFmpeg with hardware acceleration to combine the files. The chat is
+    # rendered at 1080 high, so it isn't scaled at all; a 1080p VOD is stacked
+    # as decoded, anything else is scaled on the GPU and leaves VRAM once.
+    if video_height(video_path) == 1080:
+        gpu_input, vod_leg = ["-hwaccel", "cuda"], "[0:v]"
+    else:
+        gpu_input = ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        vod_leg = "[0:v]scale_cuda=-2:1080:format=yuv420p,hwdownload,format=yuv420p[v0];[v0]"
+    cmd = [
+        "ffmpeg", *gpu_input, "-i", video_path, "-i", chat_path,
+        "-filter_complex", f"{vod_leg}[1:v]xstack=inputs=2:layout=0_0|w0_0[out]",
+        "-map", "[out]", "-map", "0:a?", *NVENC_COMBINE_ARGS, "-c:a", "aac", "-r", "30", "-shortest", output_path,
+    ]
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
     
     print(f"[✓] Video and chat combined to {output_path}")
     return output_path
@@ -124,7 +143,7 @@ def cleanup_and_download_results(remote_output_path, local_output_path=OUTPUT_FI
     print(f"\n[+] Downloading final video to local machine")
     
     # Copy the file from volume to function container
-    shutil.copy(remote_output_path, local_output_path)
+    copy_file(remote_output_path, local_output_path)
     
     # Return the path, which Modal will automatically download
     return local_output_path
@@ -8,16 +8,48 @@ All processing is done locally without Modal dependencies.
 
 import os
 import sys
+import json
 import subprocess
 import time
 import shutil
+import queue
+import threading
+import glob
+import multiprocessing
+import tempfile
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
 # Constants
 VIDEO_FILE = "forsen2.mp4"
 CHAT_FILE = "chat.mp4"
 CHAT_JSON = "chat.json"
+SPARSE_CHAT_BYTES = 1_000_000  # Chat JSON at least this big is never treated as sparse
+SPARSE_CHAT_COMMENTS = 100  # Fewer comments than this get a blank chat track instead of a render
 OUTPUT_FILE = "chat_with_video.mp4"
+PIPE_READ_SIZE = 64 * 1024  # Bytes read from a subprocess pipe at a time
+
+def _pipe_lines(pipe):
+    """Yield each line of a binary subprocess pipe as it arrives, treating \r as a line break.
+
+    Progress redraws (twitch-dl, TwitchDownloaderCLI) end in a bare \r, so
+    iterating the pipe directly would hold them back until the process exits.
+    """
+    pending = bytearray()
+    while True:
+        chunk = os.read(pipe.fileno(), PIPE_READ_SIZE)
+        if not chunk:
+            break
+        pending += chunk.replace(b"\r", b"\n")
+        *lines, rest = pending.split(b"\n")
+        pending[:] = rest
+        for line in lines:
+            if line:
+                yield bytes(line)
+    if pending:
+        yield bytes(pending)
 
 def setup_downloader():
     """Download and setup TwitchDownloaderCLI if needed"""
@@ -32,24 +64,24 @@ def setup_downloader():
     
     # Download the latest version
     print("Downloading TwitchDownloaderCLI...")
-    zip_path = bin_dir / "twitch-dl.zip"
     url = "https://github.com/lay295/TwitchDownloader/releases/download/1.55.5/TwitchDownloaderCLI-1.55.5-Linux-x64.zip"
     
-    # Use curl to download
-    subprocess.run(["curl", "-L", "-o", str(zip_path), url], check=True)
-    
-    # Unzip
-    subprocess.run(["unzip", "-o", str(zip_path), "-d", str(bin_dir)], check=True)
+    # Stream the archive into a spooled buffer (kept in memory unless it's large) and extract from there
+    with urllib.request.urlopen(url) as resp, tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as archive:
+        shutil.copyfileobj(resp, archive)
+        archive.seek(0)
+        with zipfile.ZipFile(archive) as z:
+            z.extractall(bin_dir)
     
     # Make executable
-    subprocess.run(["chmod", "+x", str(downloader_path)], check=True)
+    downloader_path.chmod(0o755)
     
     print(f"TwitchDownloaderCLI setup at {downloader_path}")
     return str(downloader_path)
 
-def download_vod(vod_id):
+def download_vod(vod_id, log=print):
     """Download Twitch VOD"""
-    print(f"\n[+] Downloading VOD (1080p60): {vod_id}")
+    log(f"\n[+] Downloading VOD (1080p60): {vod_id}")
     
     cmd = [
         "twitch-dl", "download", 
@@ -63,27 +95,26 @@ def download_vod(vod_id):
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True
+        stderr=subprocess.STDOUT
     )
     
     # Print output in real-time
-    for line in process.stdout:
-        print(f"  {line.strip()}")
+    for raw in _pipe_lines(process.stdout):
+        log(f"  {raw.decode(errors='replace').strip()}")
     
     # Wait for process to complete
     process.wait()
     
     if process.returncode != 0:
-        print(f"[✗] Failed to download VOD")
+        log(f"[✗] Failed to download VOD")
         return False
     
-    print(f"[✓] VOD downloaded to {VIDEO_FILE}")
+    log(f"[✓] VOD downloaded to {VIDEO_FILE}")
     return True
 
-def download_chat(vod_id, downloader_path):
+def download_chat(vod_id, downloader_path, log=print):
     """Download Twitch chat"""
-    print(f"\n[+] Downloading chat for VOD: {vod_id}")
+    log(f"\n[+] Downloading chat for VOD: {vod_id}")
     
     cmd = [
         downloader_path, "chatdownload",
@@ -96,27 +127,41 @@ def download_chat(vod_id, downloader_path):
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True
+        stderr=subprocess.STDOUT
     )
     
     # Print output in real-time
-    for line in process.stdout:
-        print(f"  {line.strip()}")
+    for raw in _pipe_lines(process.stdout):
+        log(f"  {raw.decode(errors='replace').strip()}")
     
     # Wait for process to complete
     process.wait()
     
     if process.returncode != 0:
-        print(f"[✗] Failed to download chat")
+        log(f"[✗] Failed to download chat")
         return False
     
-    print(f"[✓] Chat downloaded to {CHAT_JSON}")
+    log(f"[✓] Chat downloaded to {CHAT_JSON}")
     return True
 
-def render_chat(downloader_path):
+def chat_is_sparse():
+    """Return True if the downloaded chat has too few messages to be worth rendering"""
+    if os.stat(CHAT_JSON).st_size >= SPARSE_CHAT_BYTES:
+        return False
+    with open(CHAT_JSON, encoding="utf-8") as f:
+        return len(json.load(f).get("comments", [])) < SPARSE_CHAT_COMMENTS
+
+def render_chat(downloader_path, log=print):
     """Render chat JSON to MP4"""
-    print(f"\n[+] Rendering chat to video")
+    log(f"\n[+] Rendering chat to video")
+    
+    # A nearly empty chat isn't worth a full render; process_vod makes a blank
+    # track instead once the VOD (and so its duration) is available
+    if chat_is_sparse():
+        if os.path.exists(CHAT_FILE):
+            os.remove(CHAT_FILE)
+        log(f"[✓] Chat is sparse, skipping render in favour of a blank chat track")
+        return True
     
     cmd = [
         downloader_path, "chatrender",
@@ -132,91 +177,220 @@ def render_chat(downloader_path):
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True
+        stderr=subprocess.STDOUT
     )
     
     # Print output in real-time
-    for line in process.stdout:
-        print(f"  {line.strip()}")
+    for raw in _pipe_lines(process.stdout):
+        log(f"  {raw.decode(errors='replace').strip()}")
     
     # Wait for process to complete
     process.wait()
     
     if process.returncode != 0:
-        print(f"[✗] Failed to render chat")
+        log(f"[✗] Failed to render chat")
+        return False
+    
+    log(f"[✓] Chat rendered to {CHAT_FILE}")
+    return True
+
+# Hardware H.264 encoders in order of preference, with the -hwaccel that decodes for them
+HW_ENCODERS = [
+    ("h264_nvenc", "cuda"),  # NVIDIA
+    ("h264_videotoolbox", "videotoolbox"),  # Apple Silicon
+    ("h264_amf", None),  # AMD; no matching -hwaccel, so decode in software
+    ("h264_qsv", "qsv"),  # Intel
+]
+
+# Detected (encoder, hwaccel) pair, None for CPU; probed once per run
+_HW_ENCODER = None
+_hw_probed = False
+
+def _detect_hw_encoder():
+    """Return the first hardware encoder ffmpeg has built in and can actually open, or None"""
+    global _HW_ENCODER, _hw_probed
+    if _hw_probed:
+        return _HW_ENCODER
+    
+    _hw_probed = True
+    try:
+        encoders = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"],
+            capture_output=True, text=True
+        ).stdout
+    except OSError as e:
+        print(f"  Could not list ffmpeg encoders: {e}")
+        return None
+    
+    for encoder, hwaccel in HW_ENCODERS:
+        if encoder not in encoders:
+            continue
+        # Being compiled in doesn't mean the device is there; encode a few test frames
+        test = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", "nullsrc=s=64x64:d=0.1",
+             "-c:v", encoder, "-f", "null", "-"],
+            capture_output=True
+        )
+        if test.returncode == 0:
+            _HW_ENCODER = (encoder, hwaccel)
+            break
+    
+    return _HW_ENCODER
+
+# Keep NVIDIA frames in CUDA memory through decode and scale; there's no
+# hstack_cuda, so only the scaled frames are downloaded for the stack.
+# The chat is flat synthetic text, so it gets bicubic instead of Lanczos.
+CUDA_INPUT_ARGS = ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+CUDA_FILTER = (
+    "[0:v]scale_cuda=-2:1080:interp_algo=lanczos,hwdownload,format=nv12[v0];"
+    "[1:v]scale_cuda=-2:1080:interp_algo=bicubic,hwdownload,format=nv12[v1];"
+    "[v0][v1]hstack=inputs=2[out]"
+)
+
+# Throughput-oriented encoder settings: the source is already compressed, so
+# the fastest presets lose nothing visible in the archive
+NVENC_ARGS = [
+    "-c:v", "h264_nvenc", "-preset", "p1", "-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0",
+    "-maxrate", "20M", "-bufsize", "40M", "-rc-lookahead", "20", "-spatial-aq", "1",
+]
+ENCODER_ARGS = {
+    "h264_videotoolbox": ["-prio_speed", "1", "-realtime", "1"],
+    "h264_amf": ["-quality", "speed"],
+    "h264_qsv": ["-preset", "veryfast", "-look_ahead", "0"],
+}
+
+# Audio codec options for the combine; probed once per run
+_AUDIO_ARGS = None
+
+def _audio_args():
+    """Copy the VOD's audio when it's already AAC (Twitch VODs are), otherwise encode to AAC"""
+    global _AUDIO_ARGS
+    if _AUDIO_ARGS is None:
+        try:
+            codec = subprocess.check_output(
+                ["ffprobe", "-v", "error", "-select_streams", "a:0",
+                 "-show_entries", "stream=codec_name", "-of", "csv=p=0", VIDEO_FILE],
+                text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            codec = None
+        _AUDIO_ARGS = ["-c:a", "copy"] if codec == "aac" else ["-c:a", "aac", "-b:a", "160k"]
+    return _AUDIO_ARGS
+
+# Structured key=value progress on stdout in place of the \r-separated stats line
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+
+# Let the filter graph use every core; the scalers otherwise run single-threaded
+CPU_COUNT = multiprocessing.cpu_count()
+FILTER_THREAD_ARGS = ["-filter_threads", str(CPU_COUNT), "-filter_complex_threads", str(CPU_COUNT)]
+
+def _combine_cmd(hw_encoder):
+    """Build the combine command for a (encoder, hwaccel) pair, or for CPU when None"""
+    if hw_encoder and hw_encoder[0] == "h264_nvenc":
+        # Input options are positional, so the CUDA decode goes in front of each input
+        cmd = [
+            "ffmpeg", *PROGRESS_ARGS, *FILTER_THREAD_ARGS,
+            *CUDA_INPUT_ARGS, "-i", VIDEO_FILE,
+            *CUDA_INPUT_ARGS, "-i", CHAT_FILE,
+            "-filter_complex", CUDA_FILTER,
+            "-map", "[out]",
+            "-map", "0:a?",
+            *NVENC_ARGS,
+        ]
+    else:
+        cmd = ["ffmpeg", *PROGRESS_ARGS, *FILTER_THREAD_ARGS]
+        
+        # Add acceleration if one was detected
+        if hw_encoder and hw_encoder[1]:
+            cmd.extend(["-hwaccel", hw_encoder[1]])
+        
+        # Input files and processing options
+        cmd.extend([
+            "-i", VIDEO_FILE,
+            "-i", CHAT_FILE,
+            "-filter_complex", "[0:v]scale=-2:1080:flags=lanczos[v0];[1:v]scale=-2:1080:flags=bicubic[v1];[v0][v1]hstack=inputs=2[out]",
+            "-map", "[out]", 
+            "-map", "0:a?"
+        ])
+        
+        # Add encoder
+        cmd.extend(["-c:v", hw_encoder[0] if hw_encoder else "h264"])
+        if hw_encoder:
+            cmd.extend(ENCODER_ARGS.get(hw_encoder[0], []))
+    
+    # Output options
+    cmd.extend([
+        "-threads", "0",
+        *_audio_args(),
+        "-r", "30",
+        "-shortest",
+        # moov up front for seeking downstream; a deep muxing queue absorbs hstack's bursty output
+        "-movflags", "+faststart",
+        "-fflags", "+genpts",
+        "-max_muxing_queue_size", "9999",
+        OUTPUT_FILE
+    ])
+    return cmd
+
+def render_blank_chat():
+    """Write a black chat track as long as the VOD"""
+    print(f"\n[+] Creating blank chat track")
+    
+    try:
+        duration = subprocess.check_output(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", VIDEO_FILE],
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[✗] Could not read VOD duration: {e}")
+        return False
+    
+    result = subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"color=black:s=422x1080:r=30:d={duration}",
+        "-c:v", "libx264", "-tune", "stillimage", "-preset", "ultrafast",
+        CHAT_FILE
+    ])
+    
+    if result.returncode != 0:
+        print(f"[✗] Failed to create blank chat track")
         return False
     
-    print(f"[✓] Chat rendered to {CHAT_FILE}")
+    print(f"[✓] Blank chat track written to {CHAT_FILE}")
     return True
 
 def combine_videos():
     """Combine video and chat"""
     print(f"\n[+] Combining video and chat")
     
-    # Try using hardware acceleration if available
-    hw_accel_options = [
-        # NVIDIA GPU acceleration
-        ["-hwaccel", "cuda", "-c:v", "h264_nvenc"],
-        # Apple Silicon acceleration
-        ["-hwaccel", "videotoolbox", "-c:v", "h264_videotoolbox"],
-        # AMD GPU acceleration
-        ["-hwaccel", "amf", "-c:v", "h264_amf"],
-        # Intel GPU acceleration
-        ["-hwaccel", "qsv", "-c:v", "h264_qsv"],
-        # Fallback to CPU
-        [""]
-    ]
+    # Probe for a usable hardware encoder once instead of failing through each one
+    hw_encoder = _detect_hw_encoder()
+    print(f"  Using {hw_encoder[0] if hw_encoder else 'CPU'} encoding")
+    
+    # CPU stays as the fallback in case the hardware encode fails partway
+    attempts = [hw_encoder, None] if hw_encoder else [None]
     
     success = False
     
-    for accel in hw_accel_options:
+    for attempt in attempts:
+        name = attempt[0] if attempt else 'CPU'
         try:
-            print(f"  Trying {accel[0] if len(accel) > 0 else 'CPU'} acceleration...")
-            
-            # Base command
-            cmd = ["ffmpeg"]
-            
-            # Add acceleration if not empty
-            if accel and accel[0]:
-                cmd.extend(accel[:2])
-            
-            # Input files and processing options
-            cmd.extend([
-                "-i", VIDEO_FILE,
-                "-i", CHAT_FILE,
-                "-filter_complex", "[0:v]scale=-2:1080:flags=lanczos[v0];[1:v]scale=-2:1080:flags=lanczos[v1];[v0][v1]hstack=inputs=2[out]",
-                "-map", "[out]", 
-                "-map", "0:a?"
-            ])
-            
-            # Add encoder if specified
-            if accel and len(accel) > 2:
-                cmd.extend(accel[2:])
-            else:
-                cmd.extend(["-c:v", "h264"])
-            
-            # Output options
-            cmd.extend([
-                "-c:a", "aac",
-                "-r", "30",
-                "-shortest",
-                OUTPUT_FILE
-            ])
+            print(f"  Trying {name} encoding...")
+            cmd = _combine_cmd(attempt)
             
             # Run the command
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True
+                stderr=subprocess.STDOUT
             )
             
-            # Monitor for progress (looking for "frame=" output)
+            # Monitor for progress (looking for "frame=" output); only decode what gets printed
             frame_count = 0
-            for line in process.stdout:
-                if line.startswith("frame="):
-                    current_frame = int(line.split("=")[1].split()[0])
+            for raw in _pipe_lines(process.stdout):
+                if raw.startswith(b"frame="):
+                    current_frame = int(raw[6:].split(maxsplit=1)[0])
                     if current_frame > frame_count + 100:  # Update every 100 frames
                         frame_count = current_frame
                         print(f"  Progress: {current_frame} frames")
@@ -225,12 +399,12 @@ def combine_videos():
             process.wait()
             
             if process.returncode == 0:
-                print(f"[✓] Videos combined successfully using {accel[0] if len(accel) > 0 else 'CPU'}")
+                print(f"[✓] Videos combined successfully using {name}")
                 success = True
                 break
             
         except Exception as e:
-            print(f"  Error with {accel[0] if accel else 'CPU'} acceleration: {e}")
+            print(f"  Error with {name} encoding: {e}")
     
     if not success:
         print(f"[✗] Failed to combine videos with any available method")
@@ -243,11 +417,13 @@ def extract_segments():
     print(f"\n[+] Extracting segments from combined video")
     
     try:
-        subprocess.run(["python", "main.py"], check=True)
+        # Run in-process rather than cold-starting another interpreter
+        import main
+        main.run()
         print(f"[✓] Segments extracted successfully")
         return True
-    except subprocess.CalledProcessError:
-        print(f"[✗] Failed to extract segments")
+    except Exception as e:
+        print(f"[✗] Failed to extract segments: {e}")
         return False
 
 def upload_segments():
@@ -255,15 +431,68 @@ def upload_segments():
     print(f"\n[+] Uploading segments to YouTube")
     
     try:
-        subprocess.run(["python", "uploader.py"], check=True)
+        import uploader
+        uploader.main()
         print(f"[✓] Segments uploaded successfully")
         return True
-    except subprocess.CalledProcessError:
-        print(f"[✗] Failed to upload segments")
+    except Exception as e:
+        print(f"[✗] Failed to upload segments: {e}")
         return False
 
+def run_stages_in_parallel(stages):
+    """Run {name: fn(log)} stages in threads and return True if all of them succeeded.
+
+    Each stage logs through its own prefixed queue entries, which are printed
+    here on the main thread so their output doesn't interleave mid-line.
+    """
+    log_queue = queue.Queue()
+    
+    def stage_log(name):
+        return lambda message="": log_queue.put((name, str(message)))
+    
+    def print_logged():
+        while True:
+            try:
+                name, message = log_queue.get_nowait()
+            except queue.Empty:
+                return
+            for line in message.splitlines():
+                if line.strip():
+                    print(f"[{name}] {line}")
+    
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = [executor.submit(fn, stage_log(name)) for name, fn in stages.items()]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.5)
+            print_logged()
+    print_logged()
+    
+    return all(future.result() for future in futures)
+
+# Background deletions of directories moved out of the way by discard_dir
+_cleanup_threads = []
+
+def discard_dir(path):
+    """Rename a directory out of the way and delete it on a background thread"""
+    trash_path = f"{path}.trash.{os.getpid()}"
+    try:
+        os.replace(path, trash_path)
+    except OSError:
+        # Couldn't rename (e.g. a leftover trash dir); delete in place
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    thread = threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={"ignore_errors": True}, daemon=True)
+    thread.start()
+    _cleanup_threads.append(thread)
+
 def cleanup_temp_files():
     """Clean up temporary files"""
+    # Let the background directory deletions finish
+    for thread in _cleanup_threads:
+        thread.join()
+    _cleanup_threads.clear()
+    
     files_to_remove = [CHAT_JSON]
     
     for file in files_to_remove:
@@ -287,25 +516,31 @@ def process_vod(vod_id):
     cleanup_dirs = ["frames", "post_processed", "titles", "post_processed_titles"]
     cleanup_files = ["ocr_cache.json"]
     
+    # Rename instead of deleting inline; the files are removed while the VOD downloads
     for dir_name in cleanup_dirs:
         if os.path.exists(dir_name):
-            shutil.rmtree(dir_name)
+            discard_dir(dir_name)
             print(f"  Removed directory: {dir_name}")
     
+    # Trash left behind by an earlier run that exited before its deletions finished
+    for trash_path in glob.glob("*.trash.*"):
+        if os.path.isdir(trash_path) and not trash_path.endswith(f".trash.{os.getpid()}"):
+            discard_dir(trash_path)
+    
     for file_name in cleanup_files:
         if os.path.exists(file_name):
             os.remove(file_name)
             print(f"  Removed file: {file_name}")
     
-    # Download VOD and chat
-    if not download_vod(vod_id):
-        return False
-    
-    if not download_chat(vod_id, downloader_path):
+    # Download the VOD while the chat downloads and renders; the work is in child processes
+    if not run_stages_in_parallel({
+        "vod": lambda log: download_vod(vod_id, log),
+        "chat": lambda log: download_chat(vod_id, downloader_path, log) and render_chat(downloader_path, log),
+    }):
         return False
     
-    # Render chat
-    if not render_chat(downloader_path):
+    # render_chat leaves no chat video when the chat was too sparse to render
+    if not os.path.exists(CHAT_FILE) and not render_blank_chat():
         return False
     
     # Combine videos
@@ -1,7 +1,6 @@
 import asyncio
 import base64
 import hmac
-import hashlib
 import time
 from aiortc import RTCIceServer, RTCIceGatherer
 
@@ -17,8 +16,8 @@ def generate_turn_credentials():
     username = f"{expiry}:{USER_ID}"
     shared_secret = base64.b64decode(SHARED_SECRET_B64)  # 🔐 Match Go behavior: decode base64 to raw bytes
 
-    h = hmac.new(shared_secret, username.encode('utf-8'), hashlib.sha1)
-    password = base64.b64encode(h.digest()).decode('utf-8')
+    # One-shot hmac.digest skips the HMAC object; base64 output is plain ASCII
+    password = base64.b64encode(hmac.digest(shared_secret, username.encode('utf-8'), 'sha1')).decode('ascii')
 
     return username, password
 
@@ -4,14 +4,17 @@ Simple test script to verify parallel processing is working
 """
 
 import os
+import math
 import multiprocessing
 import time
 from concurrent.futures import ProcessPoolExecutor
 
 def worker_function(n):
-    """Sample worker function that just sleeps and returns a value"""
+    """Sample worker function that does CPU-bound work and returns a value"""
     print(f"Worker {n} starting...")
-    time.sleep(1)  # Simulate some work
+    # Real CPU work, heavy enough (~0.5s) to amortise pool startup; a sleep
+    # would "scale" even if every worker shared one core
+    sum(i * i for i in range(5_000_000))
     print(f"Worker {n} done")
     return n * n
 
@@ -48,10 +51,14 @@ def main():
     speedup = sequential_elapsed / elapsed if elapsed > 0 else 0
     print(f"\nSpeedup factor: {speedup:.2f}x")
     
-    if speedup > 1.5:
+    # Equal tasks run in rounds, so the best possible speedup is tasks per round
+    workers = min(multiprocessing.cpu_count(), len(numbers))
+    ideal = len(numbers) / math.ceil(len(numbers) / workers)
+    expected = 0.7 * ideal
+    if speedup > expected:
         print("✅ Parallel processing is working correctly!")
     else:
-        print("⚠️ Parallel processing may not be functioning optimally")
+        print(f"⚠️ Parallel processing may not be functioning optimally (expected over {expected:.1f}x)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
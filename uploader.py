@@ -16,35 +16,102 @@ Usage:
 python youtube_uploader.py
 
 Note: On first run, the script will open a browser window for authentication.
+The credentials are then saved to token.json and refreshed on later runs.
 """
 
+import mimetypes
 import os
 import sys
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import google.auth.transport.requests
+import google.oauth2.credentials
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
 import googleapiclient.errors
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload
 
 # Constants
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
 CLIENT_SECRETS_FILE = 'client_secret.json'
+TOKEN_FILE = 'token.json'  # Saved credentials so later runs skip the browser consent
 API_SERVICE_NAME = 'youtube'
 API_VERSION = 'v3'
 SEGMENTS_FOLDER = 'segments'  # Folder containing the video files
 VALID_EXTENSIONS = ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv']
+_EXT_SET = frozenset(ext.lstrip('.') for ext in VALID_EXTENSIONS)
+UPLOAD_WORKERS = 4  # Concurrent uploads; they're network-bound
+UPLOAD_CHUNKSIZE = 8 * 1024 * 1024  # Resumable upload chunk size (multiple of 256 KiB)
+
+
+class BufferedFileUpload(MediaIoBaseUpload):
+    """Resumable upload that reads each chunk into one reused buffer.
+
+    The stock upload hands the client a fresh bytes object per chunk; this
+    reads into a per-upload bytearray and returns a memoryview of it instead.
+    """
+
+    def __init__(self, fd, mimetype='application/octet-stream', chunksize=UPLOAD_CHUNKSIZE):
+        super().__init__(fd, mimetype, chunksize=chunksize, resumable=True)
+        self._buffer = bytearray(chunksize)
+        self._view = memoryview(self._buffer)
+
+    def has_stream(self):
+        # Make the client call getbytes rather than slicing the file object itself
+        return False
+
+    def getbytes(self, begin, length):
+        self._fd.seek(begin)
+        view = self._view[:length]
+        filled = 0
+        while filled < length:
+            n = self._fd.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        return view[:filled]
 
 
-def get_authenticated_service():
-    """Get an authenticated YouTube service instance."""
-    flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE, SCOPES)
-    credentials = flow.run_local_server(port=8080)
+def get_credentials():
+    """Return the user's credentials, refreshing saved ones before falling back to the OAuth flow."""
+    credentials = None
+    if os.path.exists(TOKEN_FILE):
+        credentials = google.oauth2.credentials.Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+
+    if credentials and credentials.valid:
+        return credentials
+
+    if credentials and credentials.expired and credentials.refresh_token:
+        try:
+            credentials.refresh(google.auth.transport.requests.Request())
+        except Exception as e:
+            print(f"Could not refresh saved credentials: {e}")
+            credentials = None
+    else:
+        credentials = None
 
+    if credentials is None:
+        flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
+            CLIENT_SECRETS_FILE, SCOPES)
+        credentials = flow.run_local_server(port=8080)
+
+    with open(TOKEN_FILE, 'w') as token:
+        token.write(credentials.to_json())
+    return credentials
+
+
+def build_service(credentials):
+    """Build a YouTube service instance from credentials."""
     return googleapiclient.discovery.build(
         API_SERVICE_NAME, API_VERSION, credentials=credentials)
 
 
+def get_authenticated_service():
+    """Get an authenticated YouTube service instance."""
+    return build_service(get_credentials())
+
+
 def initialize_upload(youtube, file_path, title):
     """Initialize a YouTube video upload."""
     body = {
@@ -59,42 +126,45 @@ def initialize_upload(youtube, file_path, title):
         }
     }
 
-    # Create MediaFileUpload instance
-    media = MediaFileUpload(file_path, chunksize=1024 * 1024, resumable=True)
-
-    # Call the API's videos.insert method to create and upload the video
-    request = youtube.videos().insert(
-        part=','.join(body.keys()),
-        body=body,
-        media_body=media
-    )
-
-    # Upload the video
-    print(f"Uploading {title}...")
-    response = None
-    error = None
-    retry = 0
-
-    while response is None:
-        try:
-            status, response = request.next_chunk()
-            if status:
-                print(f"Uploaded {int(status.progress() * 100)}%")
-        except googleapiclient.errors.HttpError as e:
-            error = f"An HTTP error {e.resp.status} occurred:\n{e.content}"
-            if retry < 10:
-                retry += 1
-                print(f"Retrying... (attempt {retry})")
-                time.sleep(retry * 2)  # Exponential backoff
-            else:
-                break
-
-    if error:
-        print(error)
-        return None
-
-    print(f"Upload Complete! Video ID: {response['id']}")
-    return response['id']
+    # Read the file unbuffered straight into the upload's chunk buffer
+    with open(file_path, 'rb', buffering=0) as fd:
+        mimetype = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        media = BufferedFileUpload(fd, mimetype)
+
+        # Call the API's videos.insert method to create and upload the video
+        request = youtube.videos().insert(
+            part=','.join(body.keys()),
+            body=body,
+            media_body=media
+        )
+
+        # Upload the video
+        print(f"Uploading {title}...")
+        response = None
+        error = None
+        retry = 0
+
+        while response is None:
+            try:
+                status, response = request.next_chunk()
+                error = None
+                if status:
+                    print(f"{title}: uploaded {int(status.progress() * 100)}%")
+            except googleapiclient.errors.HttpError as e:
+                error = f"An HTTP error {e.resp.status} occurred:\n{e.content}"
+                if retry < 10:
+                    retry += 1
+                    print(f"Retrying... (attempt {retry})")
+                    time.sleep(retry * 2)  # Exponential backoff
+                else:
+                    break
+
+        if error:
+            print(error)
+            return None
+
+        print(f"Upload Complete! Video ID: {response['id']}")
+        return response['id']
 
 
 def main():
@@ -105,47 +175,47 @@ def main():
         return
 
     # Get a list of video files in the segments folder
-    video_files = []
-    for filename in os.listdir(SEGMENTS_FOLDER):
-        file_path = os.path.join(SEGMENTS_FOLDER, filename)
-        if os.path.isfile(file_path):
-            _, ext = os.path.splitext(filename)
-            if ext.lower() in VALID_EXTENSIONS:
-                video_files.append(file_path)
+    with os.scandir(SEGMENTS_FOLDER) as entries:
+        video_files = [
+            entry.path for entry in entries
+            if entry.is_file() and entry.name.rpartition('.')[2].lower() in _EXT_SET
+        ]
 
     if not video_files:
         print(f"No video files found in the '{SEGMENTS_FOLDER}' folder.")
         return
 
-    # Authenticate and get YouTube service
+    # Authenticate once; each upload thread builds its own service from these
     try:
-        youtube = get_authenticated_service()
+        credentials = get_credentials()
         print("Authentication successful!")
     except Exception as e:
         print(f"Authentication failed: {e}")
         return
 
-    # Upload each video
-    for video_path in video_files:
+    # The API client isn't safe to share between threads, so keep one per worker
+    local = threading.local()
+
+    def upload_video(video_path):
         # Get the filename without extension as the title
         filename = os.path.basename(video_path)
         title, _ = os.path.splitext(filename)
 
         try:
-            video_id = initialize_upload(youtube, video_path, title)
+            if not hasattr(local, 'youtube'):
+                local.youtube = build_service(credentials)
+            video_id = initialize_upload(local.youtube, video_path, title)
             if video_id:
-                print(f"Uploaded: {title} (Video ID: {video_id})")
-                print(f"Video URL: https://www.youtube.com/watch?v={video_id}")
-                print("-" * 50)
-
-                # Add a delay between uploads to avoid rate limiting
-                if video_path != video_files[-1]:  # If not the last video
-                    print("Waiting before next upload...")
-                    time.sleep(1)  # Wait 10 seconds between uploads
-
+                print(f"Uploaded: {title} (Video ID: {video_id})\n"
+                      f"Video URL: https://www.youtube.com/watch?v={video_id}\n"
+                      + "-" * 50)
         except Exception as e:
             print(f"Error uploading {title}: {e}")
 
+    # Upload several videos at once
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        list(executor.map(upload_video, video_files))
+
     print("All uploads completed!")
 
 
@@ -19,172 +19,578 @@ import sys
 import subprocess
 import time
 import argparse
+import json
 import re
+import selectors
+import shutil
 from pathlib import Path
 from tqdm import tqdm  # For progress bars
 
 
-def run_command(command, description):
-    """Run a shell command with live output and handle errors"""
-    print(f"[+] {description}...")
+# twitch-dl segment progress, matched on the raw output bytes
+_SEG_RE = re.compile(rb'\[download\] Downloading segment (\d+)/(\d+)')
+# ffmpeg's -progress key=value records
+_PROGRESS_RE = re.compile(rb'(\w+)=(\S*)$')
+
+
+def make_output_handler(prefix="  "):
+    """Return a function that prints each raw line of command output as it comes.
+
+    Lines stay bytes and are only decoded when printed. This is the handler for
+    the chat render, whose progress is already one line per update.
+    """
+    def handle(raw):
+        print(f"{prefix}{raw.decode(errors='replace')}")
+
+    handle.close = lambda: None
+    return handle
+
+
+def make_download_handler(prefix="  ", rewrite=True):
+    """Return a line handler for twitch-dl download that condenses its segment progress.
+
+    With rewrite, the progress line overwrites its previous one; that's turned
+    off when several commands share the terminal.
+    """
+    # Variables to track progress
+    state = {"last_segment": None, "total_segments": None}
+    seg_match = _SEG_RE.match
+    show = make_output_handler(prefix)
+
+    def handle(raw):
+        m = seg_match(raw)
+        if m:
+            current_segment = int(m.group(1))
+            total_segments = int(m.group(2))
+            state["total_segments"] = total_segments
+            last_segment = state["last_segment"]
+
+            # Only update the display for every 5th segment or when we reach a new percentage
+            if last_segment is None or current_segment % 5 == 0 or current_segment == total_segments:
+                percent = int((current_segment / total_segments) * 100)
+                # Clear the previous progress line if it exists
+                if rewrite and last_segment is not None:
+                    sys.stdout.write("\033[F\033[K")  # Move cursor up and clear line
+                print(f"{prefix}Progress: {current_segment}/{total_segments} segments ({percent}%)")
+                state["last_segment"] = current_segment
+        elif raw.startswith(b"Downloading ") and b"VODs using" in raw:
+            # This is the "Downloading X VODs using Y workers" line
+            show(raw)
+            state["total_segments"] = int(raw.split()[1])
+            print(f"{prefix}Progress: 0/{state['total_segments']} segments (0%)")
+        else:
+            # Other download messages
+            show(raw)
+
+    handle.close = show.close
+    return handle
+
+
+def make_ffmpeg_handler(prefix="  ", duration=None):
+    """Return a line handler for ffmpeg that turns its -progress records into a tqdm bar.
+
+    The bar runs against the probed duration in seconds (open-ended if it's
+    unknown); all other output is printed as it comes.
+    """
+    state = {"duration_us": int(duration * 1e6) if duration else None, "out_time_us": 0, "bar": None}
+    progress_match = _PROGRESS_RE.match
+    show = make_output_handler(prefix)
+
+    def handle(raw):
+        m = progress_match(raw)
+        if m:
+            key, value = m.groups()
+            if key == b"out_time_us" and value.isdigit():
+                update_bar(int(value))
+            elif key == b"progress" and value == b"end":
+                close()
+            return
+        show(raw)
+
+    def update_bar(out_time_us):
+        if state["bar"] is None:
+            state["bar"] = tqdm(total=state["duration_us"], desc=prefix.strip() or None, leave=True,
+                                bar_format="  {l_bar}{bar}| {percentage:3.0f}% [{elapsed}<{remaining}]")
+        state["bar"].update(max(out_time_us - state["out_time_us"], 0))
+        state["out_time_us"] = max(out_time_us, state["out_time_us"])
+
+    def close():
+        if state["bar"] is not None:
+            state["bar"].close()
+            state["bar"] = None
+
+    def covered(slack=0):
+        # Whether the encode has reached the probed duration, give or take `slack` seconds
+        return state["duration_us"] is not None and state["out_time_us"] >= state["duration_us"] - slack * 1e6
+
+    handle.close = close
+    handle.covered = covered
+    return handle
+
+
+def make_line_handler(command, prefix="  ", rewrite=True, duration=None):
+    """Return the line handler for a command's output, chosen once from its program"""
+    program = Path(command[0]).stem
+    if program == "ffmpeg":
+        return make_ffmpeg_handler(prefix, duration)
+    if program == "twitch-dl" and command[1:2] == ["download"]:
+        return make_download_handler(prefix, rewrite)
+    return make_output_handler(prefix)
+
+
+# How far (seconds) a FIFO consumer's encode may still be from the end when its
+# producer exits with an error for that to count as the EPIPE of a consumer that
+# stopped reading. Progress is only reported twice a second, so at GPU speeds
+# the last record can trail the encode by several seconds
+PRODUCER_EXIT_SLACK = 30
+
+# Bytes read from a command's output pipe per wakeup
+PIPE_READ_SIZE = 1 << 20
+
+
+def start_command(command):
+    """Start a command (an argv list) with its output (stdout and stderr) on one pipe.
+
+    Returns the process and, if ffmpeg's -progress was moved off stdout onto
+    a pipe of its own, the read end of that pipe (else None). pass_fds isn't
+    available on Windows, where the records stay on stdout.
+    """
+    # run_commands reads the pipes with os.read in PIPE_READ_SIZE chunks, so
+    # an unbuffered pipe object is enough; no second buffer in between
+    if "-progress" not in command or os.name == "nt":
+        return subprocess.Popen(command, bufsize=0, stdout=subprocess.PIPE, stderr=subprocess.STDOUT), None
+
+    progress_read, progress_write = os.pipe()
+    command = list(command)
+    command[command.index("-progress") + 1] = f"pipe:{progress_write}"
     try:
-        # Use Popen to get live output
         process = subprocess.Popen(
             command,
-            shell=True,
+            bufsize=0,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            bufsize=1
+            pass_fds=(progress_write,)
         )
+    except BaseException:
+        os.close(progress_read)
+        raise
+    finally:
+        os.close(progress_write)
+    return process, progress_read
 
-        # Variables to track progress
-        last_segment = None
-        total_segments = None
-        downloading_line_count = 0
-
-        # Print output in real-time, with special handling for twitch-dl progress
-        for line in iter(process.stdout.readline, ''):
-            line = line.strip()
-            if not line:
-                continue
-
-            # Handle twitch-dl download progress
-            if line.startswith("Downloading ") and "VODs using" in line:
-                # This is the "Downloading X VODs using Y workers" line
-                print(f"  {line}")
-                total_segments = int(line.split()[1])
-                print(f"  Progress: 0/{total_segments} segments (0%)")
-            elif line.startswith("[download]"):
-                # This is a twitch-dl download progress line
-                if "Downloading segment" in line:
-                    segment_parts = line.split()
-                    current_segment = int(segment_parts[2].split('/')[0])
-                    total_segments = int(segment_parts[2].split('/')[1])
-
-                    # Only update the display for every 5th segment or when we reach a new percentage
-                    if last_segment is None or current_segment % 5 == 0 or current_segment == total_segments:
-                        percent = int((current_segment / total_segments) * 100)
-                        # Clear the previous progress line if it exists
-                        if last_segment is not None:
-                            sys.stdout.write("\033[F\033[K")  # Move cursor up and clear line
-                        print(f"  Progress: {current_segment}/{total_segments} segments ({percent}%)")
-                        last_segment = current_segment
+
+def release_fifo(fifo):
+    """Open and close the write end of a FIFO so a reader blocked opening it sees EOF"""
+    try:
+        os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+    except OSError:
+        pass  # No reader has it open, so nobody is waiting
+
+
+def run_commands(commands, pipes=None, return_codes=None):
+    """Run commands concurrently with live output and return True if all of them succeed.
+
+    Each entry is (command, description) or (command, description, after):
+    an entry with `after` starts only once the command with that description
+    has succeeded, and the command may then be a function returning it. A
+    command is an argv list, or (argv, duration) for an ffmpeg command whose
+    progress bar should run against that many seconds. If
+    any command fails, the others are stopped, since a streamed stage would
+    otherwise wait on its partner forever.
+
+    `pipes` maps a producer's description to (consumer description, FIFO)
+    for a command writing into a FIFO another one reads. The consumer may
+    stop reading early (-shortest), so a producer failing once the consumer's
+    encode has (nearly) reached its duration is ignored, and the producer is
+    stopped as soon as the consumer succeeds; failing any earlier fails the
+    stage.
+
+    If given, `return_codes` is filled with the exit code of each command
+    (by description) that exited before the run stopped.
+    """
+    concurrent = len(commands) > 1
+    waiting = [entry for entry in commands if len(entry) > 2]
+    pipes = pipes or {}
+    return_codes = {} if return_codes is None else return_codes
+    jobs = []
+    sel = selectors.DefaultSelector()
+
+    def job_for(description):
+        return next((job for job in jobs if job["description"] == description), None)
+
+    def launch(command, description):
+        if callable(command):
+            command = command()
+        duration = None
+        if isinstance(command, tuple):
+            command, duration = command
+        print(f"[+] {description}...")
+        process, progress_fd = start_command(command)
+        prefix = f"  [{description}] " if concurrent else "  "
+        job = {
+            "process": process,
+            "description": description,
+            "handle": make_line_handler(command, prefix, rewrite=not concurrent, duration=duration),
+            "progress_fd": progress_fd,
+            "done": False,
+        }
+        jobs.append(job)
+        sel.register(process.stdout, selectors.EVENT_READ, {"job": job, "pending": bytearray()})
+        if progress_fd is not None:
+            sel.register(progress_fd, selectors.EVENT_READ, {"job": job, "pending": bytearray()})
+
+    success = True
+    try:
+        for entry in commands:
+            if len(entry) == 2:
+                launch(*entry)
+
+        # Print output from every command as it arrives
+        while sel.get_map():
+            for key, _ in sel.select():
+                stream = key.data
+                job = stream["job"]
+                chunk = os.read(key.fd, PIPE_READ_SIZE)
+                pending = stream["pending"]
+                if chunk:
+                    # Progress redraws (twitch-dl, ffmpeg) end in a bare \r, so
+                    # that's a line break too, as it was with universal newlines
+                    pending += chunk.replace(b"\r", b"\n")
+                    *lines, rest = pending.split(b"\n")
+                    pending[:] = rest
                 else:
-                    # Other download messages
-                    print(f"  {line}")
-            # For ffmpeg progress
-            elif line.startswith("frame="):
-                # Only print every 10th ffmpeg progress line to avoid overwhelming output
-                if downloading_line_count % 10 == 0:
-                    print(f"  {line}")
-                downloading_line_count += 1
-            # For chat rendering progress
-            elif "Rendering chat" in line or "Fetching chat" in line:
-                print(f"  {line}")
-            else:
-                # All other output
-                print(f"  {line}")
-
-        # Wait for process to complete and get return code
-        return_code = process.wait()
-
-        if return_code != 0:
-            print(f"[✗] {description} failed with return code {return_code}")
-            return False
-
-        print(f"[✓] {description} completed successfully")
-        return True
+                    lines = [bytes(pending)]
+                    pending.clear()
+                for raw in lines:
+                    raw = raw.strip()
+                    if raw:
+                        job["handle"](raw)
+                if chunk:
+                    continue
+
+                if key.fd == job["progress_fd"]:
+                    # Progress pipe closed; the process is reaped when its output closes
+                    sel.unregister(key.fd)
+                    os.close(key.fd)
+                    job["progress_fd"] = None
+                    continue
+
+                # Output closed: wait for the process and get its return code
+                sel.unregister(key.fileobj)
+                return_code = job["process"].wait()
+                job["done"] = True
+                description = job["description"]
+                return_codes[description] = return_code
+                if description in pipes:
+                    consumer_description, fifo = pipes[description]
+                    consumer = job_for(consumer_description)
+                    if consumer is not None:
+                        # Don't leave the consumer blocked opening a FIFO nobody will write
+                        release_fifo(fifo)
+                        if consumer["done"]:
+                            pass  # Stopped once the consumer had finished
+                        elif return_code != 0:
+                            # An EPIPE at the very end is fine; dying mid-stream would leave
+                            # the consumer to finish with the rest of its input cut off
+                            covered = getattr(consumer["handle"], "covered", None)
+                            if not (covered and covered(PRODUCER_EXIT_SLACK)):
+                                print(f"[✗] {description} failed with return code {return_code} "
+                                      f"before {consumer_description} had read everything")
+                                success = False
+                                break
+                            print(f"[i] {description} exited with return code {return_code} "
+                                  f"after {consumer_description} had stopped reading")
+                        else:
+                            print(f"[✓] {description} completed successfully")
+                        continue
+                if return_code != 0:
+                    print(f"[✗] {description} failed with return code {return_code}")
+                    success = False
+                    break
+                print(f"[✓] {description} completed successfully")
+
+                # A producer is no longer needed once the command reading its FIFO has succeeded
+                for producer_description, (consumer_description, _) in pipes.items():
+                    producer = job_for(producer_description)
+                    if consumer_description == description and producer and not producer["done"]:
+                        print(f"[i] Stopping {producer_description}; {description} has everything it needs")
+                        producer["process"].terminate()
+
+                # Start whatever was waiting on this command
+                for entry in [entry for entry in waiting if entry[2] == description]:
+                    waiting.remove(entry)
+                    launch(entry[0], entry[1])
+            if not success:
+                break
     except Exception as e:
-        print(f"[✗] Error during {description}: {str(e)}")
-        return False
+        print(f"[✗] Error while running commands: {e}")
+        success = False
+    finally:
+        sel.close()
+        for job in jobs:
+            if job["process"].poll() is None:
+                job["process"].kill()
+            job["process"].wait()
+            job["process"].stdout.close()
+            if job["progress_fd"] is not None:
+                os.close(job["progress_fd"])
+            job["handle"].close()
+
+    return success and not waiting
 
 
-def download_vod(vod_id, output_file="forsen2.mp4"):
-    """Download the Twitch VOD with progress bar"""
-    # First get information about the VOD to estimate total size
-    print("[+] Getting VOD information...")
-    info_command = f'twitch-dl info {vod_id}'
+def run_command(command, description):
+    """Run a command with live output and handle errors"""
+    return run_commands([(command, description)])
 
-    try:
-        info = subprocess.check_output(info_command, shell=True, universal_newlines=True)
-
-        # Try to extract duration for progress estimation
-        duration_match = re.search(r'Duration:\s+(\d+):(\d+):(\d+)', info)
-        if duration_match:
-            h, m, s = map(int, duration_match.groups())
-            total_seconds = h * 3600 + m * 60 + s
-            print(f"[i] VOD duration: {h:02d}:{m:02d}:{s:02d} ({total_seconds} seconds)")
-        else:
-            total_seconds = None
-            print("[i] Could not determine VOD duration")
 
-        # Extract title if available
-        title_match = re.search(r'Title:\s+(.+)', info)
-        if title_match:
-            title = title_match.group(1).strip()
-            print(f"[i] VOD title: {title}")
+# Parallel segment fetches per download; Twitch starts rate-limiting well before the
+# hundreds of workers twitch-dl would accept, so requests are capped here
+DEFAULT_DOWNLOAD_WORKERS = 20
+MAX_DOWNLOAD_WORKERS = 64
 
-    except subprocess.CalledProcessError:
-        print("[!] Could not get VOD information")
-        total_seconds = None
 
-    # Now download the VOD
+def vod_download_command(vod_id, output_file="forsen2.mp4", workers=DEFAULT_DOWNLOAD_WORKERS):
+    """Return the command that downloads the Twitch VOD"""
+    # Download the VOD
     print(f"[+] Downloading VOD (1080p60) to {output_file}...")
 
-    command = f'twitch-dl download -q 1080p60 {vod_id} -o "{output_file}" --chapter 1'
-    return run_command(command, "Downloading VOD")
+    workers = max(1, min(workers, MAX_DOWNLOAD_WORKERS))
+    return ["twitch-dl", "download", "-q", "1080p60", vod_id, "-o", output_file, "--chapter", "1", "-w", str(workers)]
+
+
+def download_vod(vod_id, output_file="forsen2.mp4", workers=DEFAULT_DOWNLOAD_WORKERS):
+    """Download the Twitch VOD with progress bar"""
+    return run_command(vod_download_command(vod_id, output_file, workers), "Downloading VOD")
+
+
+# The chat is rendered at the combined video's height so it can be stacked as-is
+OUTPUT_HEIGHT = 720
+CHAT_WIDTH = 300
+CHAT_HEIGHT = OUTPUT_HEIGHT
+
+
+def chat_download_command(vod_id, output_file="chat.mp4", video_format=None, width=CHAT_WIDTH, height=CHAT_HEIGHT):
+    """Return the command that downloads and renders the chat"""
+    # A missing chat shows up as this command failing; the VOD's title and
+    # duration come from probing the download, so nothing is looked up first
+    print(f"[+] Downloading and rendering chat to {output_file}...")
+    command = ["twitch-dl", "chat", "--dark", "--width", str(width), "--height", str(height), vod_id, "-o", output_file]
+    if video_format:
+        command += ["--format", video_format, "--overwrite"]
+    return command
+
+
+def make_chat_fifo(chat_file):
+    """Create a named pipe for the chat render to stream through, or return None if we can't.
+
+    The pipe gets a .mkv name: MP4 can't be written to a pipe, Matroska can.
+    """
+    if os.name != "posix":
+        return None
+    fifo_path = os.path.splitext(chat_file)[0] + ".mkv"
+    try:
+        if os.path.exists(fifo_path):
+            os.remove(fifo_path)
+        os.mkfifo(fifo_path)
+    except OSError as e:
+        print(f"[!] Could not create chat pipe, rendering chat to a file instead: {e}")
+        return None
+    return fifo_path
 
 
 def download_chat(vod_id, output_file="chat.mp4"):
     """Download and render the chat with progress updates"""
-    print("[+] Preparing to download and render chat...")
+    return run_command(chat_download_command(vod_id, output_file), "Downloading and rendering chat")
+
+
+# Hardware H.264 encoders in order of preference, with their quality settings
+HW_ENCODERS = ["h264_nvenc", "h264_amf", "h264_qsv", "h264_videotoolbox"]
+ENCODER_ARGS = {
+    "h264_nvenc": ["-preset", "p4", "-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0"],
+    "h264_amf": ["-usage", "transcoding", "-quality", "balanced", "-rc", "cqp", "-qp_i", "22", "-qp_p", "24"],
+    "h264_qsv": ["-preset", "medium", "-global_quality", "23"],
+    "h264_videotoolbox": [],
+    "libx264": ["-preset", "veryfast", "-crf", "23"],
+}
 
-    # First, get information about the chat (this will show if it's available)
+
+def test_encoder(encoder):
+    """Return True if ffmpeg can actually open `encoder` and encode a few frames with it"""
     try:
-        info_cmd = f'twitch-dl chat --stats {vod_id}'
-        chat_info = subprocess.check_output(info_cmd, shell=True, universal_newlines=True)
-        print(f"[i] Chat info: {chat_info.strip()}")
-    except:
-        print("[!] Could not get chat statistics, but will try to download anyway")
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i", "nullsrc=s=256x256:d=0.1",
+             "-pix_fmt", "yuv420p", "-c:v", encoder, "-f", "null", "-"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return False
+    return result.returncode == 0
 
-    # Now download and render the chat
-    command = f'twitch-dl chat --dark --width 300 --height 1080 {vod_id} -o "{output_file}"'
-    return run_command(command, "Downloading and rendering chat")
+
+def detect_hw_encoder():
+    """Return the first hardware H.264 encoder that works here, or libx264 if there is none"""
+    try:
+        encoders = subprocess.check_output(
+            ["ffmpeg", "-hide_banner", "-encoders"], universal_newlines=True, stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "libx264"
+    for encoder in HW_ENCODERS:
+        # Builds often list encoders with no usable device or driver behind them
+        if encoder in encoders and test_encoder(encoder):
+            return encoder
+    return "libx264"
 
 
-def combine_video_and_chat(video_file="forsen2.mp4", chat_file="chat.mp4", output_file="chat_with_video.mp4"):
-    """Combine the video and chat side by side with progress bar"""
-    # Get video duration for progress estimation
+def probe(path):
+    """Return ffprobe's format and stream information for a media file as a dict"""
+    return json.loads(subprocess.check_output(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        universal_newlines=True
+    ))
+
+
+def video_info(path):
+    """Probe the downloaded VOD once and return its duration, title, fps and codecs"""
+    try:
+        data = probe(path)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        print("[!] Could not probe the video")
+        return {}
+
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    stream = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    info = {
+        "title": fmt.get("tags", {}).get("title"),
+        "codec": stream.get("codec_name"),
+        "audio_codec": audio.get("codec_name"),
+    }
     try:
-        ffprobe_cmd = f'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "{video_file}"'
-        duration_str = subprocess.check_output(ffprobe_cmd, shell=True, universal_newlines=True).strip()
-        duration = float(duration_str)
+        info["duration"] = float(fmt["duration"])
+    except (KeyError, ValueError):
+        info["duration"] = None
+    try:
+        num, _, den = stream.get("avg_frame_rate", "").partition("/")
+        info["fps"] = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        info["fps"] = None
+
+    duration = info["duration"]
+    if duration:
         print(f"[i] Video duration: {int(duration // 60):02d}:{int(duration % 60):02d} ({duration:.2f} seconds)")
-    except:
-        duration = None
+    else:
         print("[!] Could not determine video duration")
+    if info["title"]:
+        print(f"[i] VOD title: {info['title']}")
+    if info["fps"] or info["codec"]:
+        print(f"[i] Video stream: {info['codec']} at {info['fps'] or 0:.2f} fps")
+    return info
+
+
+def combine_command(video_file="forsen2.mp4", chat_file="chat.mp4", output_file="chat_with_video.mp4",
+                    encoder="libx264", info=None, chat_size=(CHAT_WIDTH, CHAT_HEIGHT)):
+    """Return the ffmpeg command that puts the video and chat side by side, with the VOD's probed duration"""
+    if info is None:
+        info = video_info(video_file)
+
+    encoder_args = list(ENCODER_ARGS.get(encoder, []))
+    if encoder == "h264_nvenc" and (info.get("fps") or 0) > 30:
+        # Twice the frames to encode; trade a little quality for keeping up
+        encoder_args[encoder_args.index("p4")] = "p2"
+
+    thread_args = []
+    if encoder == "libx264":
+        # The CPU does the scaling and the encode; let both use every core
+        cores = str(os.cpu_count() or 1)
+        thread_args = ["-filter_threads", cores, "-filter_complex_threads", cores]
+        encoder_args += ["-threads", "0"]
+
+    # Twitch audio is already AAC; only re-encode when the probe says otherwise
+    audio_args = ["-c:a", "copy"] if info.get("audio_codec") in (None, "aac") else ["-c:a", "aac", "-b:a", "128k"]
+
+    # Both legs end up with even widths (scaled with -2, or a chat rendered at
+    # an even width), so the stacked width is even and needs no pad pass. A chat
+    # rendered at the output height skips its scale entirely
+    chat_width, chat_height = chat_size
+    scale_chat = chat_height != OUTPUT_HEIGHT or chat_width % 2
+    if encoder == "h264_nvenc":
+        # Decode and scale in CUDA memory; there's no hstack_cuda, so only the
+        # scaled frames come back to system memory for the stack
+        input_args = ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        chat_scale = f"scale_cuda=-2:{OUTPUT_HEIGHT}," if scale_chat else ""
+        filter_complex = (
+            f"[0:v]scale_cuda=-2:{OUTPUT_HEIGHT},hwdownload,format=nv12[v0];"
+            f"[1:v]{chat_scale}hwdownload,format=nv12[v1];"
+        )
+    else:
+        # AMF on Windows can at least decode through D3D11
+        input_args = ["-hwaccel", "d3d11va"] if encoder == "h264_amf" and os.name == "nt" else []
+        chat_leg = f"[1:v]scale=-2:{OUTPUT_HEIGHT}[v1];" if scale_chat else ""
+        filter_complex = f"[0:v]scale=-2:{OUTPUT_HEIGHT}[v0];{chat_leg}"
+    stack_inputs = "[v0][v1]" if encoder == "h264_nvenc" or scale_chat else "[v0][1:v]"
+
+    # Machine-readable progress instead of the stats line; run_commands moves it onto its own pipe
+    command = [
+        "ffmpeg", *thread_args, *input_args, "-i", video_file, *input_args, "-i", chat_file,
+        "-filter_complex", filter_complex + f"{stack_inputs}hstack=inputs=2[out]",
+        "-map", "[out]", "-map", "0:a?", "-c:v", encoder, *encoder_args, *audio_args, "-shortest",
+        "-movflags", "+faststart", "-progress", "pipe:1", "-nostats", output_file,
+    ]
+    return command, info.get("duration")
+
+
+def combine_video_and_chat(video_file="forsen2.mp4", chat_file="chat.mp4", output_file="chat_with_video.mp4",
+                           encoder="libx264", chat_size=(CHAT_WIDTH, CHAT_HEIGHT)):
+    """Combine the video and chat side by side with progress bar, falling back to libx264"""
+    if run_command(combine_command(video_file, chat_file, output_file, encoder, chat_size=chat_size),
+                   "Combining video and chat"):
+        return True
+    if encoder == "libx264":
+        return False
+    print(f"[!] Combining with {encoder} failed; retrying with libx264")
+    return run_command(combine_command(video_file, chat_file, output_file, "libx264", chat_size=chat_size),
+                       "Combining video and chat")
+
+
+# Room to leave for a rendered chat track before putting it in RAM; a 300px-wide
+# render of even a long stream stays well under this
+CHAT_SIZE_ESTIMATE = 2 << 30
+SHM_DIR = "/dev/shm"
 
-    # Add progress output to ffmpeg
-    command = (
-        f'ffmpeg -i "{video_file}" -i "{chat_file}" '
-        '-filter_complex "[0:v]scale=-2:720[v0];[1:v]scale=-2:720[v1];'
-        '[v0][v1]hstack=inputs=2, pad=ceil(iw/2)*2:ih[out]" '
-        f'-map "[out]" -map "0:a?" -c:v libx264 -c:a aac -shortest '
-        f'-progress - -stats "{output_file}"'
-    )
-    return run_command(command, "Combining video and chat")
+
+def chat_tmpdir(requested=None):
+    """Return the directory to render the chat file into, or None to keep it where it is.
+
+    An explicit --tmpdir wins; otherwise /dev/shm is used when it exists and
+    has room, so the combine reads the chat back from RAM instead of disk.
+    """
+    if requested:
+        return requested
+    if not os.path.isdir(SHM_DIR):
+        return None
+    try:
+        if shutil.disk_usage(SHM_DIR).free < CHAT_SIZE_ESTIMATE:
+            return None
+    except OSError:
+        return None
+    return SHM_DIR
 
 
 def cleanup(files_to_remove):
     """Clean up temporary files"""
     for file in files_to_remove:
-        if os.path.exists(file):
-            try:
-                os.remove(file)
-                print(f"[✓] Removed temporary file: {file}")
-            except Exception as e:
-                print(f"[!] Failed to remove {file}: {e}")
+        # One unlink per file; a file that's already gone is fine
+        try:
+            Path(file).unlink()
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            print(f"[!] Failed to remove {file}: {e}")
+            continue
+        print(f"[✓] Removed temporary file: {file}")
 
 
 def main():
@@ -196,6 +602,16 @@ def main():
     parser.add_argument("--video-file", default="forsen2.mp4", help="Temporary video filename")
     parser.add_argument("--chat-file", default="chat.mp4", help="Temporary chat filename")
     parser.add_argument("--verbose", "-v", action="store_true", help="Show detailed progress information")
+    parser.add_argument("--workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help=f"Parallel VOD segment downloads (capped at {MAX_DOWNLOAD_WORKERS})")
+    parser.add_argument("--no-fifo", action="store_true",
+                        help="Render the chat to a file instead of streaming it into the combine")
+    parser.add_argument("--encoder", help="Video encoder to use (default: first available hardware encoder, else libx264)")
+    parser.add_argument("--chat-width", type=int, default=CHAT_WIDTH, help="Width of the rendered chat")
+    parser.add_argument("--chat-height", type=int, default=CHAT_HEIGHT,
+                        help=f"Height of the rendered chat; anything but {OUTPUT_HEIGHT} is scaled in the combine")
+    parser.add_argument("--tmpdir", help=f"Directory for the rendered chat file when it isn't streamed "
+                                         f"(default: {SHM_DIR} if it has room)")
 
     args = parser.parse_args()
 
@@ -207,28 +623,69 @@ def main():
     print(f"  Twitch VOD Processor - VOD ID: {args.vod_id}")
     print("=" * 60 + "\n")
 
-    # Step 1: Download the VOD
-    print("\n" + "-" * 30 + " STAGE 1: VOD Download " + "-" * 30)
-    if not download_vod(args.vod_id, args.video_file):
-        print("\n[!] Failed to download VOD. Exiting.")
-        return 1
-
-    # Step 2: Download the chat
-    print("\n" + "-" * 30 + " STAGE 2: Chat Download " + "-" * 30)
-    if not download_chat(args.vod_id, args.chat_file):
-        print("\n[!] Failed to download chat. Exiting.")
-        return 1
-
-    # Step 3: Combine video and chat
-    print("\n" + "-" * 30 + " STAGE 3: Video Processing " + "-" * 30)
-    if not combine_video_and_chat(args.video_file, args.chat_file, args.output):
-        print("\n[!] Failed to combine video and chat. Exiting.")
-        return 1
+    encoder = args.encoder or detect_hw_encoder()
+    print(f"[i] Using video encoder: {encoder}")
+
+    chat_size = (args.chat_width, args.chat_height)
+    chat_fifo = None if args.no_fifo else make_chat_fifo(args.chat_file)
+    vod_downloaded = False
+    if chat_fifo:
+        # Stream the chat render through a pipe straight into the combine, which
+        # starts once the VOD is down, instead of writing and re-reading chat.mp4
+        print("\n" + "-" * 30 + " STAGES 1-3: Download, Chat Render and Combine " + "-" * 30)
+        return_codes = {}
+        if run_commands([
+            (vod_download_command(args.vod_id, args.video_file, args.workers), "Downloading VOD"),
+            (chat_download_command(args.vod_id, chat_fifo, "mkv", *chat_size), "Downloading and rendering chat"),
+            (lambda: combine_command(args.video_file, chat_fifo, args.output, encoder, chat_size=chat_size),
+             "Combining video and chat", "Downloading VOD"),
+        ], pipes={"Downloading and rendering chat": ("Combining video and chat", chat_fifo)},
+                return_codes=return_codes):
+            temp_files = [args.video_file, chat_fifo]
+        elif (encoder != "libx264" and return_codes.get("Downloading VOD") == 0
+              and return_codes.get("Combining video and chat", 0) != 0):
+            # The streamed chat is gone with the failed encode, so render it to a
+            # file and go through the regular combine, which falls back to libx264
+            print(f"\n[!] Combining with {encoder} failed; rendering the chat to a file to retry")
+            cleanup([chat_fifo])
+            chat_fifo = None
+            vod_downloaded = True
+        else:
+            print("\n[!] Failed to download, render or combine. Exiting.")
+            cleanup([chat_fifo])
+            return 1
+    if not chat_fifo:
+        tmpdir = chat_tmpdir(args.tmpdir)
+        if tmpdir:
+            args.chat_file = os.path.join(tmpdir, os.path.basename(args.chat_file))
+            print(f"[i] Rendering chat to {args.chat_file}")
+
+        # Steps 1-2: Download the VOD and the chat at the same time; they share nothing
+        print("\n" + "-" * 30 + " STAGES 1-2: VOD and Chat Download " + "-" * 30)
+        commands = [
+            (chat_download_command(args.vod_id, args.chat_file, None, *chat_size), "Downloading and rendering chat"),
+        ]
+        if not vod_downloaded:
+            commands.insert(0, (vod_download_command(args.vod_id, args.video_file, args.workers), "Downloading VOD"))
+        if not run_commands(commands):
+            print("\n[!] Failed to download VOD or chat. Exiting.")
+            if tmpdir == SHM_DIR:
+                cleanup([args.chat_file])  # Don't leave it holding RAM
+            return 1
+
+        # Step 3: Combine video and chat
+        print("\n" + "-" * 30 + " STAGE 3: Video Processing " + "-" * 30)
+        if not combine_video_and_chat(args.video_file, args.chat_file, args.output, encoder, chat_size):
+            print("\n[!] Failed to combine video and chat. Exiting.")
+            if tmpdir == SHM_DIR:
+                cleanup([args.chat_file])  # Don't leave it holding RAM
+            return 1
+        temp_files = [args.video_file, args.chat_file]
 
     # Clean up temporary files if not keeping them
     if not args.keep_temp:
         print("\n" + "-" * 30 + " STAGE 4: Cleanup " + "-" * 30)
-        cleanup([args.video_file, args.chat_file])
+        cleanup(temp_files)
 
     # Calculate and display elapsed time
     elapsed_time = time.time() - start_time